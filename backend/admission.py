@@ -0,0 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from shared_metrics import live_gauges
+
+admission_rejected = Counter(
+    "chat_admission_rejected_total", "Messages refused or delayed by admission control",
+    ["reason", "transport"]
+)
+overloaded_gauge = Gauge(
+    "chat_overloaded", "1 while this pod is shedding load", multiprocess_mode="livemax"
+)
+
+
+class AdmissionController:
+    """Decides whether a message may be processed now.
+
+    Two independent checks:
+
+    - the pod is overloaded while event loop lag or total send queue depth is
+      above its limit; every sender is then refused until it recovers
+    - each sender has a token bucket of ``sender_burst`` messages refilled at
+      ``sender_rate`` per second
+
+    ``admit`` returns None when the message may go ahead, otherwise the number
+    of seconds the sender should wait (the HTTP Retry-After, or how long a
+    WebSocket stops being read).
+    """
+
+    def __init__(self, lag: Callable[[], float], queue_depth: Callable[[], int],
+                 max_lag: float = 0.1, max_queue_depth: int = 50000,
+                 sender_rate: float = 20.0, sender_burst: float = 40.0,
+                 overload_retry_after: float = 1.0, check_interval: float = 0.1,
+                 max_senders: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.lag = lag
+        self.queue_depth = queue_depth
+        self.max_lag = max_lag
+        self.max_queue_depth = max_queue_depth
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.overload_retry_after = overload_retry_after
+        self.check_interval = check_interval
+        self.max_senders = max_senders
+        self.clock = clock
+        # sender -> (tokens, updated at), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._overloaded = False
+        self._checked_at = float("-inf")
+        live_gauges.register(overloaded_gauge, lambda: float(self._overloaded))
+
+    def overloaded(self) -> bool:
+        """Load check, refreshed at most every ``check_interval`` so it stays cheap per message"""
+        now = self.clock()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._overloaded = (
+                self.lag() > self.max_lag or self.queue_depth() > self.max_queue_depth
+            )
+        return self._overloaded
+
+    def admit(self, sender_id: str, transport: str) -> Optional[float]:
+        if self.overloaded():
+            admission_rejected.labels(reason="overload", transport=transport).inc()
+            return self.overload_retry_after
+
+        now = self.clock()
+        tokens, updated_at = self._buckets.get(sender_id, (self.sender_burst, now))
+        tokens = min(self.sender_burst, tokens + (now - updated_at) * self.sender_rate)
+        if tokens < 1:
+            self._update(sender_id, tokens, now)
+            admission_rejected.labels(reason="rate_limited", transport=transport).inc()
+            return (1 - tokens) / self.sender_rate
+
+        self._update(sender_id, tokens - 1, now)
+        return None
+
+    async def wait(self, sender_id: str, transport: str = "websocket"):
+        """Block until the sender is admitted; while this waits its socket is not read,
+        so a fast client's frames back up in its own TCP buffers instead of this pod"""
+        while (retry_after := self.admit(sender_id, transport)) is not None:
+            await asyncio.sleep(retry_after)
+
+    def _update(self, sender_id: str, tokens: float, now: float):
+        if sender_id in self._buckets:
+            self._buckets.move_to_end(sender_id)
+        elif len(self._buckets) >= self.max_senders:
+            # Clients pick their own ids, so eviction must stay O(1): drop the least
+            # recently seen sender, whose bucket has most likely refilled anyway
+            self._buckets.popitem(last=False)
+        self._buckets[sender_id] = (tokens, now)
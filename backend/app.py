@@ -1,15 +1,50 @@
 import asyncio
-import json
+import math
+import os
 import time
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, Optional, Set
 
 import redis.asyncio as redis
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import Counter, Gauge, Histogram, generate_latest
 from starlette.responses import Response
 
+from admission import AdmissionController
+from drain import ConnectionDrainer, install_sigterm_drain, signal_sibling_workers
+from fanout import POD_ID, WORKER_ID, RedisFanout
+from history import HistoryWriter, read_page, read_since
+from load_signals import (
+    EventLoopLagMonitor, LatencyWindow, fanout_latency, requests_in_flight
+)
+from message_rate import MessageRateCounter
+from send_queue import ClientConnection, OverflowPolicy
+from shared_metrics import (
+    MULTIPROCESS, live_gauges, mark_worker_dead, metrics_registry, pod_totals
+)
+from wire_format import JSON, codec_for, codec_for_content_type, dumps
+
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "256"))  # Per-connection outbound frames
+SEND_OVERFLOW_POLICY = OverflowPolicy(os.getenv("SEND_OVERFLOW_POLICY", "drop_oldest"))
+FANOUT_CHANNEL = os.getenv("FANOUT_CHANNEL", "chat:fanout")
+DEFAULT_ROOM = os.getenv("DEFAULT_ROOM", "general")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.05"))  # seconds
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "10000"))
+HISTORY_MAX_LENGTH = int(os.getenv("HISTORY_MAX_LENGTH", "1000"))  # Approximate, per room
+REPLAY_LIMIT = int(os.getenv("REPLAY_LIMIT", "500"))  # Messages replayed on reconnect
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.1"))  # seconds
+DRAIN_WINDOW_SECONDS = float(os.getenv("DRAIN_WINDOW_SECONDS", "20"))
+DRAIN_BATCH_SIZE = int(os.getenv("DRAIN_BATCH_SIZE", "50"))
+DRAIN_RECONNECT_JITTER_SECONDS = float(os.getenv("DRAIN_RECONNECT_JITTER_SECONDS", "5"))
+ADMISSION_MAX_LOOP_LAG = float(os.getenv("ADMISSION_MAX_LOOP_LAG", "0.1"))  # seconds
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "50000"))  # frames, all sockets
+SENDER_RATE_LIMIT = float(os.getenv("SENDER_RATE_LIMIT", "20"))  # messages/s per sender
+SENDER_BURST = float(os.getenv("SENDER_BURST", "40"))
+OVERLOAD_RETRY_AFTER = float(os.getenv("OVERLOAD_RETRY_AFTER", "1"))  # seconds
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn worker processes per pod
+
 app = FastAPI(title="Chat Service")
 
 app.add_middleware(
@@ -27,74 +62,168 @@ redis_client = redis.Redis(
 
 # Prometheus metrics
 messages_total = Counter("chat_messages_total", "Total number of messages processed")
+# Gauges are summed (or maxed) across the workers of a pod in multiprocess mode
 active_connections_gauge = Gauge(
-    "chat_active_connections", "Number of active WebSocket connections"
+    "chat_active_connections", "Number of active WebSocket connections",
+    multiprocess_mode="livesum"
 )
 message_latency = Histogram(
     "chat_message_latency_seconds", "Message processing latency"
 )
-messages_per_second = Gauge("chat_messages_per_second", "Messages per second rate")
+messages_per_second = Gauge(
+    "chat_messages_per_second", "Messages per second rate", multiprocess_mode="livesum"
+)
+message_rate_gauge = Gauge(
+    "chat_message_rate", "Messages per second over a trailing window", ["window"],
+    multiprocess_mode="livesum"
+)
+active_rooms_gauge = Gauge(
+    "chat_active_rooms", "Rooms with at least one local connection (per worker, summed)",
+    multiprocess_mode="livesum"
+)
+delivered_per_second = Gauge(
+    "chat_messages_delivered_per_second", "Frames queued to local sockets per second over a trailing window",
+    ["window"], multiprocess_mode="livesum"
+)
+send_queue_depth_total = Gauge(
+    "chat_send_queue_depth_total", "Frames waiting in all per-connection send queues",
+    multiprocess_mode="livesum"
+)
+send_queue_depth_max = Gauge(
+    "chat_send_queue_depth_max", "Deepest per-connection send queue", multiprocess_mode="livemax"
+)
+
+RATE_WINDOWS = (1, 10, 60)  # seconds
+
+
+def history_key(room: str) -> str:
+    return f"chat_history:{room}"
+
+
+def history_record(sender_id, message, ts: int) -> Dict[str, str]:
+    """Stream fields; Redis only takes strings, and clients may send any JSON value"""
+    return {
+        "sender": "" if sender_id is None else str(sender_id),
+        "message": "" if message is None else str(message),
+        "timestamp": datetime.utcnow().isoformat(),
+        "ts": str(ts),
+    }
+
 
 # Connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.message_rates: list = []
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.rooms: Dict[str, Set[str]] = {}  # room -> local client ids
         self.rate_window = 60  # seconds
+        self.message_rate = MessageRateCounter(self.rate_window)
+        self.delivered_rate = MessageRateCounter(self.rate_window)
+        self.fanout_latency = {"local": LatencyWindow(), "remote": LatencyWindow()}
         
-    def update_message_rate(self):
-        """Update message rate by cleaning up old timestamps"""
-        current_time = time.time()
-        self.message_rates = [
-            t for t in self.message_rates if t > current_time - self.rate_window
-        ]
-        messages_per_second.set(len(self.message_rates) / self.rate_window)
+        # Rates and queue depths are computed at scrape time, so recording a message stays O(1)
+        live_gauges.register(messages_per_second, lambda: self.message_rate.rate(self.rate_window))
+        for window in RATE_WINDOWS:
+            live_gauges.register(
+                message_rate_gauge.labels(window=f"{window}s"),
+                lambda window=window: self.message_rate.rate(window),
+            )
+            live_gauges.register(
+                delivered_per_second.labels(window=f"{window}s"),
+                lambda window=window: self.delivered_rate.rate(window),
+            )
+        live_gauges.register(send_queue_depth_total, lambda: sum(self.queue_depths()))
+        live_gauges.register(send_queue_depth_max, lambda: max(self.queue_depths(), default=0))
+        
+    def queue_depths(self):
+        return [len(connection.queue) for connection in self.active_connections.values()]
+
 
-    async def connect(self, websocket: WebSocket, client_id: str):
+    def record_message(self):
+        self.message_rate.increment()
+
+    async def connect(self, websocket: WebSocket, client_id: str, room: str,
+                      codec=JSON) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[client_id] = websocket
+        connection = ClientConnection(
+            websocket, client_id, room, SEND_QUEUE_SIZE, SEND_OVERFLOW_POLICY, codec
+        )
+        connection.start()
+        self.disconnect(client_id)
+        self.active_connections[client_id] = connection
+        self.rooms.setdefault(room, set()).add(client_id)
         active_connections_gauge.set(len(self.active_connections))
+        active_rooms_gauge.set(len(self.rooms))
+        return connection
 
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+    def disconnect(self, client_id: str, connection: Optional[ClientConnection] = None):
+        """Remove a client; with ``connection`` only if it is still the current one"""
+        current = self.active_connections.get(client_id)
+        if current is not None and (connection is None or current is connection):
+            connection = self.active_connections.pop(client_id)
+            connection.stop()
+            members = self.rooms.get(connection.room)
+            if members is not None:
+                members.discard(client_id)
+                if not members:
+                    del self.rooms[connection.room]
             active_connections_gauge.set(len(self.active_connections))
+            active_rooms_gauge.set(len(self.rooms))
 
-    async def send_personal_message(self, message: str, client_id: str):
+    def send_personal_message(self, message: dict, client_id: str):
         if client_id in self.active_connections:
-            await self.active_connections[client_id].send_text(message)
+            self.active_connections[client_id].send(message)
+
+    def deliver_local(self, message_data: str, sender_id: str, room: str,
+                      origin: str = "local"):
+        """Hand an encoded message to the writer of each local member of the
+        room; slow clients only fill their own queue instead of delaying the sender.
 
-    async def broadcast(self, message: str, sender_id: str):
+        ``message_data`` is JSON text; it is transcoded at most once for each
+        other wire format in use by a recipient.
+        """
+        start_time = time.perf_counter()
+        recipients = [
+            self.active_connections[client_id]
+            for client_id in self.rooms.get(room, ()) if client_id != sender_id
+        ]
+        frames = {JSON.name: message_data}
+        slow_consumers = []
+        for connection in recipients:
+            frame = frames.get(connection.codec.name)
+            if frame is None:
+                frame = frames[connection.codec.name] = connection.codec.encode(
+                    JSON.decode(message_data)
+                )
+            if not connection.enqueue(frame):
+                slow_consumers.append(connection.client_id)
+        for client_id in slow_consumers:
+            self.disconnect(client_id)
+        
+        self.delivered_rate.increment(len(recipients) - len(slow_consumers))
+        elapsed = time.perf_counter() - start_time
+        fanout_latency.labels(origin=origin).observe(elapsed)
+        self.fanout_latency[origin].observe(elapsed)
+
+    def deliver_remote(self, message_data: str, sender_id: str, room: str):
+        self.deliver_local(message_data, sender_id, room, origin="remote")
+
+    async def broadcast(self, message: str, sender_id: str, room: str):
         start_time = time.time()
         
         # Update message rate
-        self.message_rates.append(time.time())
-        self.update_message_rate()
-        
-        # Store in Redis
-        await redis_client.lpush(
-            "chat_messages",
-            json.dumps(
-                {
-                    "sender": sender_id,
-                    "message": message,
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
-            ),
-        )
-        await redis_client.ltrim("chat_messages", 0, 999)  # Keep last 1000 messages
+        self.record_message()
         
-        # Broadcast to all connections
-        tasks = []
-        for client_id, connection in self.active_connections.items():
-            if client_id != sender_id:
-                message_data = json.dumps(
-                    {"sender": sender_id, "message": message, "type": "broadcast"}
-                )
-                tasks.append(connection.send_text(message_data))
+        # Store in Redis (batched by the history writer)
+        ts = int(start_time * 1000)
+        history.append(history_key(room), history_record(sender_id, message, ts))
         
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        # Encode once, deliver to this pod's sockets and publish once for the others.
+        # Clients can resume from "ts" with ?since= after reconnecting
+        message_data = dumps(
+            {"sender": sender_id, "message": message, "type": "broadcast", "room": room, "ts": ts}
+        )
+        self.deliver_local(message_data, sender_id, room)
+        fanout.publish(room, sender_id, message_data)
         
         # Update metrics
         messages_total.inc()
@@ -102,18 +231,60 @@ class ConnectionManager:
 
 
 manager = ConnectionManager()
+# Origin is per worker so sibling workers in a pod receive each other's broadcasts
+fanout = RedisFanout(redis_client, FANOUT_CHANNEL, manager.deliver_remote, pod_id=WORKER_ID)
+history = HistoryWriter(
+    redis_client,
+    max_length=HISTORY_MAX_LENGTH,
+    batch_size=HISTORY_BATCH_SIZE,
+    flush_interval=HISTORY_FLUSH_INTERVAL,
+    max_buffer=HISTORY_BUFFER_SIZE,
+)
+loop_monitor = EventLoopLagMonitor(interval=EVENT_LOOP_LAG_INTERVAL)
+admission = AdmissionController(
+    lag=lambda: loop_monitor.last_lag,
+    queue_depth=lambda: sum(manager.queue_depths()),
+    max_lag=ADMISSION_MAX_LOOP_LAG,
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    sender_rate=SENDER_RATE_LIMIT,
+    sender_burst=SENDER_BURST,
+    overload_retry_after=OVERLOAD_RETRY_AFTER,
+)
+drainer = ConnectionDrainer(
+    manager,
+    window=DRAIN_WINDOW_SECONDS,
+    batch_size=DRAIN_BATCH_SIZE,
+    jitter=DRAIN_RECONNECT_JITTER_SECONDS,
+)
+in_flight = {"http": 0}
+live_gauges.register(requests_in_flight, lambda: in_flight["http"])
+
+
+@app.middleware("http")
+async def track_in_flight(request: Request, call_next):
+    in_flight["http"] += 1
+    try:
+        return await call_next(request)
+    finally:
+        in_flight["http"] -= 1
 
-# Background task to update message rate
-async def update_metrics_task():
-    """Background task to periodically update metrics"""
-    while True:
-        await asyncio.sleep(5)  # Update every 5 seconds
-        manager.update_message_rate()
 
-# Start background task
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(update_metrics_task())
+    fanout.start()
+    history.start()
+    loop_monitor.start()
+    live_gauges.start()
+    install_sigterm_drain(drainer)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_monitor.stop()
+    await live_gauges.stop()
+    await fanout.stop()
+    await history.stop()
+    mark_worker_dead()
 
 
 @app.get("/")
@@ -123,6 +294,11 @@ async def root():
 
 @app.get("/health")
 async def health():
+    if drainer.draining:
+        return Response(
+            content=dumps({"status": "draining"}), status_code=503,
+            media_type="application/json"
+        )
     try:
         await redis_client.ping()
         return {"status": "healthy", "redis": "connected"}
@@ -130,79 +306,194 @@ async def health():
         return {"status": "unhealthy", "error": str(e)}, 503
 
 
+@app.post("/drain")
+async def drain():
+    """Start draining (called by the preStop hook); returns once every client has been told to move"""
+    if WORKERS > 1:
+        # Only one worker receives this request; the others drain on SIGTERM, in parallel
+        signal_sibling_workers()
+    await asyncio.shield(drainer.start())
+    return {"status": "drained", "pod": POD_ID}
+
+
 @app.get("/metrics")
 async def metrics():
-    return Response(content=generate_latest(), media_type="text/plain")
+    return Response(content=generate_latest(metrics_registry()), media_type="text/plain")
 
 
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await manager.connect(websocket, client_id)
+async def websocket_endpoint(websocket: WebSocket, client_id: str, room: str = DEFAULT_ROOM,
+                             since: Optional[str] = None, encoding: str = JSON.name):
+    if drainer.draining or admission.overloaded():
+        # 1013 "Try Again Later": refused before the handshake completes
+        await websocket.close(code=1013)
+        return
+    try:
+        codec = codec_for(encoding)
+    except ValueError:
+        await websocket.close(code=1003)  # Unsupported data
+        return
+    
+    connection = await manager.connect(websocket, client_id, room, codec)
     
     try:
-        await manager.broadcast(f"{client_id} joined the chat", client_id)
+        if since:
+            # Catch up from the client's last stream ID or "ts"; live messages
+            # already flow, so a message at the boundary may arrive twice
+            try:
+                missed = await read_since(redis_client, history_key(room), since, REPLAY_LIMIT)
+                if missed:
+                    connection.send({"type": "replay", "messages": missed})
+            except Exception:
+                pass  # Replay is best effort
+        
+        await manager.broadcast(f"{client_id} joined the chat", client_id, room)
         
         while True:
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("bytes") or frame.get("text") or ""
             
             try:
-                message_data = json.loads(data)
-                if message_data.get("type") == "ping":
-                    await websocket.send_text(json.dumps({"type": "pong"}))
-                else:
-                    await manager.broadcast(message_data.get("message", ""), client_id)
-            except json.JSONDecodeError:
-                await manager.broadcast(data, client_id)
+                message_data = codec.decode(data)
+            except ValueError:
+                message_data = None
+            
+            if not isinstance(message_data, dict):
+                # Plain text frames are broadcast as-is
+                if isinstance(data, str):
+                    await admission.wait(client_id)
+                    await manager.broadcast(data, client_id, room)
+            elif message_data.get("type") == "ping":
+                manager.send_personal_message({"type": "pong"}, client_id)
+            else:
+                await admission.wait(client_id)
+                await manager.broadcast(message_data.get("message", ""), client_id, room)
                 
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
-        await manager.broadcast(f"{client_id} left the chat", "system")
+        manager.disconnect(client_id, connection)
+        if not drainer.draining:
+            # Migrating clients are rejoining elsewhere, not leaving
+            await manager.broadcast(f"{client_id} left the chat", "system", room)
 
 
 @app.get("/stats")
 async def get_stats():
-    return {
+    """Load signals for this pod; each value is also exported on /metrics"""
+    queue_depths = manager.queue_depths()
+    stats = {
+        "pod": POD_ID,
+        "draining": drainer.draining,
         "active_connections": len(manager.active_connections),
-        "messages_per_second": messages_per_second._value.get(),
-        "total_messages": messages_total._value.get(),
+        "active_rooms": len(manager.rooms),
+        "messages_per_second": manager.message_rate.rate(manager.rate_window),
+        "total_messages": manager.message_rate.total,
+        "throughput": {
+            "received_per_second": {
+                f"{w}s": manager.message_rate.rate(w) for w in RATE_WINDOWS
+            },
+            "delivered_per_second": {
+                f"{w}s": manager.delivered_rate.rate(w) for w in RATE_WINDOWS
+            },
+            "total_delivered": manager.delivered_rate.total,
+        },
+        "event_loop_lag_seconds": {
+            "last": loop_monitor.last_lag,
+            "max": loop_monitor.max_lag(),
+        },
+        "send_queue_depth": {
+            "total": sum(queue_depths),
+            "max": max(queue_depths, default=0),
+        },
+        "broadcast_fanout_seconds": {
+            origin: window.summary() for origin, window in manager.fanout_latency.items()
+        },
+        "requests_in_flight": in_flight["http"],
+        "overloaded": admission.overloaded(),
+    }
+    if MULTIPROCESS:
+        # The fields above describe the worker that served this request
+        totals = pod_totals(
+            ["chat_active_connections", "chat_messages_per_second", "chat_messages_total"]
+        )
+        stats["worker_pid"] = os.getpid()
+        stats["pod_totals"] = {
+            "workers": WORKERS,
+            "active_connections": totals["chat_active_connections"],
+            "messages_per_second": totals["chat_messages_per_second"],
+            "total_messages": totals["chat_messages_total"],
+        }
+    return stats
+
+
+@app.get("/api/history")
+async def get_history(room: str = DEFAULT_ROOM, before: Optional[str] = None, limit: int = 50):
+    """Newest-first history page; pass ``next_cursor`` as ``before`` for the next page"""
+    limit = max(1, min(limit, 500))
+    try:
+        messages = await read_page(redis_client, history_key(room), before, limit)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return {
+        "room": room,
+        "messages": messages,
+        "next_cursor": messages[-1]["id"] if len(messages) == limit else None,
     }
 
 
 @app.post("/api/message")
-async def send_message_http(message_data: dict):
-    """HTTP endpoint to send messages - distributes load evenly across pods"""
+async def send_message_http(request: Request):
+    """HTTP endpoint to send messages - distributes load evenly across pods.
+
+    Bodies are JSON or msgpack by Content-Type; the response follows Accept.
+    """
     start_time = time.time()
     
+    try:
+        message_data = codec_for_content_type(request.headers.get("content-type")).decode(
+            await request.body()
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed message body")
+    if not isinstance(message_data, dict):
+        raise HTTPException(status_code=400, detail="Message body must be an object")
+    
     sender_id = message_data.get("sender", "http_client")
     message = message_data.get("message", "")
+    room = message_data.get("room", DEFAULT_ROOM)
+    if not isinstance(sender_id, str) or not isinstance(room, str):
+        raise HTTPException(status_code=400, detail="sender and room must be strings")
+    
+    retry_after = admission.admit(sender_id, "http")
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429, detail="Too many messages",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
     
     # Update message rate (same as WebSocket)
-    manager.message_rates.append(time.time())
-    manager.update_message_rate()
+    manager.record_message()
     
     # Store in Redis (same as WebSocket)
-    await redis_client.lpush(
-        "chat_messages",
-        json.dumps(
-            {
-                "sender": sender_id,
-                "message": message,
-                "timestamp": datetime.utcnow().isoformat(),
-            }
-        ),
-    )
-    await redis_client.ltrim("chat_messages", 0, 999)  # Keep last 1000 messages
+    history.append(history_key(room), history_record(sender_id, message, int(start_time * 1000)))
     
     # Update metrics (same as WebSocket)
     messages_total.inc()
     message_latency.observe(time.time() - start_time)
     
-    return {
-        "status": "success",
-        "sender": sender_id,
-        "message": message,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    response_codec = codec_for_content_type(request.headers.get("accept"))
+    return Response(
+        content=response_codec.encode({
+            "status": "success",
+            "sender": sender_id,
+            "message": message,
+            "room": room,
+            "timestamp": datetime.utcnow().isoformat()
+        }),
+        media_type=response_codec.content_type,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the chat backend's hot paths, in-process, without Redis or a network.
+
+Drives the real FastAPI app through its ASGI interface with fake WebSocket
+clients and an in-memory Redis (fakes.py), for each combination of
+connection count and message rate:
+
+- websocket: one sender per room sends stamped messages; the last member
+  of each room observes delivery. This covers the receive loop, admission,
+  ConnectionManager.broadcast, rate tracking, history batching and the send
+  queue writers.
+- http: POST /api/message (send_message_http) through the middleware stack.
+
+Per message it reports CPU time of the whole process and latency (send to
+delivery at the observer, or request to response). With --allocations it
+also reports peak and retained Python memory from tracemalloc, which slows
+everything down, so CPU figures from that run are not comparable.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The benchmark offers far more load per sender than production clients do
+os.environ.setdefault("SENDER_RATE_LIMIT", "1000000000")
+os.environ.setdefault("SENDER_BURST", "1000000000")
+os.environ.setdefault("ADMISSION_MAX_LOOP_LAG", "1000000000")
+os.environ.setdefault("ADMISSION_MAX_QUEUE_DEPTH", "1000000000")
+
+import app as backend  # noqa: E402
+from fakes import FakeRedis, FakeWebSocket, asgi_request  # noqa: E402
+from wire_format import codec_for, dumps  # noqa: E402
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(p / 100 * len(ordered))) - 1)]
+
+
+async def settle(timeout: float = 30.0):
+    """Wait until every send queue has been written out"""
+    deadline = time.perf_counter() + timeout
+    while any(backend.manager.queue_depths()) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+
+
+class Measurement:
+    """CPU, wall time and (optionally) Python allocations over one benchmark run"""
+
+    def __init__(self, allocations: bool):
+        self.allocations = allocations
+
+    def __enter__(self) -> "Measurement":
+        if self.allocations:
+            tracemalloc.start()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cpu = time.process_time() - self._cpu
+        self.wall = time.perf_counter() - self._wall
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.retained = current - self._memory
+            self.peak = peak - self._memory
+
+    def row(self, messages: int) -> Dict[str, float]:
+        row = {
+            "cpu_us": self.cpu / messages * 1e6 if messages else 0.0,
+            "cpu_util": self.cpu / self.wall if self.wall else 0.0,
+        }
+        if self.allocations:
+            row["peak_kib"] = self.peak / 1024
+            row["retained_b"] = self.retained / messages if messages else 0.0
+        return row
+
+
+async def paced(rate: float, duration: float, send):
+    """Call ``send(seq, intended)`` at a fixed rate, open loop"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for seq in range(int(rate * duration)):
+        intended = start + seq / rate
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        send(seq, intended)
+
+
+async def bench_websocket(connections: int, rate: float, duration: float, room_size: int,
+                          encoding: str, allocations: bool) -> Dict[str, float]:
+    codec = codec_for(encoding)
+    loop = asyncio.get_running_loop()
+    sent_at: Dict[int, float] = {}
+    latencies: List[float] = []
+
+    def observe(frame):
+        message = codec.decode(frame)
+        for item in message["messages"] if message.get("type") == "batch" else [message]:
+            text = item.get("message", "")
+            if text.isdigit() and int(text) in sent_at:
+                latencies.append(loop.time() - sent_at[int(text)])
+
+    clients: List[FakeWebSocket] = []
+    senders: List[FakeWebSocket] = []
+    for i in range(connections):
+        room, position = divmod(i, room_size)
+        last = position == room_size - 1 or i == connections - 1
+        client = FakeWebSocket(
+            backend.app, f"/ws/bench-{i}", f"room=bench-{room}&encoding={encoding}",
+            on_frame=observe if last and position > 0 else None,
+        )
+        if not await client.connect():
+            raise RuntimeError(f"Connection {i} refused with code {client.close_code}")
+        clients.append(client)
+        if position == 0:
+            senders.append(client)
+    await settle()  # Join announcements
+
+    def send(seq: int, intended: float):
+        sent_at[seq] = intended
+        frame = codec.encode({"type": "message", "message": str(seq)})
+        sender = senders[seq % len(senders)]
+        if isinstance(frame, bytes):
+            sender.send_bytes(frame)
+        else:
+            sender.send_text(frame)
+
+    frames_before = sum(client.frames for client in clients)
+    with Measurement(allocations) as measurement:
+        await paced(rate, duration, send)
+        await asyncio.sleep(0.01)  # Let the last frames reach the endpoint
+        await settle()
+    delivered = sum(client.frames for client in clients) - frames_before
+
+    await asyncio.gather(*(client.close() for client in clients))
+    await settle()
+
+    messages = len(sent_at)
+    row = measurement.row(messages)
+    row.update({
+        "messages": messages,
+        "frames_per_message": delivered / messages if messages else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    })
+    return row
+
+
+async def bench_http(rate: float, duration: float, senders: int,
+                     allocations: bool) -> Dict[str, float]:
+    loop = asyncio.get_running_loop()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    tasks = set()
+
+    async def request(seq: int, intended: float):
+        body = dumps({"sender": f"bench-{seq % senders}", "message": f"message {seq}"})
+        status, _ = await asgi_request(
+            backend.app, "POST", "/api/message", body.encode(),
+            [("content-type", "application/json")],
+        )
+        statuses[status] = statuses.get(status, 0) + 1
+        latencies.append(loop.time() - intended)
+
+    def send(seq: int, intended: float):
+        task = asyncio.create_task(request(seq, intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    with Measurement(allocations) as measurement:
+        await paced(rate, duration, send)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    messages = len(latencies)
+    row = measurement.row(messages)
+    row.update({
+        "messages": messages,
+        "errors": messages - statuses.get(200, 0),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    })
+    return row
+
+
+def print_row(label: str, row: Dict[str, float], allocations: bool, extra: str):
+    line = (f"{label} {row['messages']:>8} {row['cpu_us']:>10.1f} {row['cpu_util']:>6.0%} "
+            f"{extra} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+    if allocations:
+        line += f" {row['peak_kib']:>9.0f} {row['retained_b']:>10.0f}"
+    print(line)
+
+
+async def run(args):
+    fake_redis = FakeRedis()
+    backend.redis_client = fake_redis
+    backend.fanout.redis = fake_redis
+    backend.history.redis = fake_redis
+    await backend.startup_event()
+
+    connection_counts = [int(c) for c in args.connections.split(",")]
+    rates = [float(r) for r in args.rates.split(",")]
+    memory_header = f" {'peak KiB':>9} {'retained B':>10}" if args.allocations else ""
+    try:
+        if args.scenario in ("websocket", "all"):
+            print(f"WebSocket broadcast ({args.encoding}, rooms of {args.room_size})")
+            print(f"{'conns':>7} {'msg/s':>7} {'messages':>8} {'cpu us/msg':>10} {'cpu':>6} "
+                  f"{'frames/msg':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}{memory_header}")
+            for connections in connection_counts:
+                for rate in rates:
+                    row = await bench_websocket(connections, rate, args.duration,
+                                                args.room_size, args.encoding, args.allocations)
+                    print_row(f"{connections:>7} {rate:>7g}", row, args.allocations,
+                              f"{row['frames_per_message']:>10.1f}")
+
+        if args.scenario in ("http", "all"):
+            print("\nHTTP POST /api/message")
+            print(f"{'msg/s':>7} {'messages':>8} {'cpu us/msg':>10} {'cpu':>6} "
+                  f"{'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}{memory_header}")
+            for rate in rates:
+                row = await bench_http(rate, args.duration, args.senders, args.allocations)
+                print_row(f"{rate:>7g}", row, args.allocations, f"{row['errors']:>6}")
+    finally:
+        await backend.shutdown_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process chat backend benchmark")
+    parser.add_argument("--scenario", choices=["websocket", "http", "all"], default="all")
+    parser.add_argument("--connections", default="100,1000,5000",
+                        help="Comma-separated WebSocket connection counts")
+    parser.add_argument("--rates", default="100,1000",
+                        help="Comma-separated message rates (msg/s)")
+    parser.add_argument("--duration", type=float, default=3.0,
+                        help="Seconds of load per combination")
+    parser.add_argument("--room-size", type=int, default=50, help="Connections per room")
+    parser.add_argument("--encoding", choices=["json", "msgpack"], default="json",
+                        help="Wire format of the WebSocket clients")
+    parser.add_argument("--senders", type=int, default=1000, help="Distinct HTTP sender ids")
+    parser.add_argument("--allocations", action="store_true",
+                        help="Trace Python allocations (much slower)")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-message cost of message-rate tracking at high message rates.
+
+Compares the previous timestamp-list approach (rebuild the list on every
+message) with the per-second bucket ring in message_rate.py, using a simulated
+clock so the message rate is exact and independent of machine speed.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_rate import MessageRateCounter  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TimestampListRate:
+    """The previous ConnectionManager.update_message_rate implementation"""
+
+    def __init__(self, clock, rate_window: int = 60):
+        self.clock = clock
+        self.rate_window = rate_window
+        self.message_rates: list = []
+        self.value = 0.0
+
+    def prefill(self, rate: int, seconds: int):
+        step = 1.0 / rate
+        start = self.clock() - seconds
+        self.message_rates = [start + i * step for i in range(seconds * rate)]
+
+    def record_message(self):
+        self.message_rates.append(self.clock())
+        current_time = self.clock()
+        self.message_rates = [
+            t for t in self.message_rates if t > current_time - self.rate_window
+        ]
+        self.value = len(self.message_rates) / self.rate_window
+
+
+class BucketRate:
+    def __init__(self, clock, rate_window: int = 60):
+        self.counter = MessageRateCounter(rate_window, clock=clock)
+        self.clock = clock
+
+    def prefill(self, rate: int, seconds: int):
+        now = self.clock.now
+        for second in range(seconds, 0, -1):
+            self.clock.now = now - second
+            self.counter.increment(rate)
+        self.clock.now = now
+
+    def record_message(self):
+        self.counter.increment()
+
+
+def run(tracker_cls, rate: int, messages: int) -> float:
+    """Nanoseconds per recorded message at ``rate`` msg/s with a full 60s window"""
+    clock = FakeClock()
+    tracker = tracker_cls(clock)
+    tracker.prefill(rate, 60)
+    step = 1.0 / rate
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        clock.now += step
+        tracker.record_message()
+    elapsed = time.perf_counter() - start
+    return elapsed / messages * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message-rate tracking microbenchmark")
+    parser.add_argument("--rates", default="100,1000,5000,20000",
+                        help="Comma-separated message rates (msg/s) to benchmark")
+    parser.add_argument("--messages", type=int, default=200,
+                        help="Messages measured per rate for the timestamp list")
+    parser.add_argument("--skip-list", action="store_true",
+                        help="Only benchmark the bucket ring")
+
+    args = parser.parse_args()
+    rates = [int(r) for r in args.rates.split(",")]
+
+    print(f"{'msg/s':>8} {'list ns/msg':>14} {'bucket ns/msg':>14} {'speedup':>9}")
+    for rate in rates:
+        # The ring is cheap enough to measure a few simulated seconds of traffic
+        bucket_ns = run(BucketRate, rate, max(args.messages, 5 * rate))
+        if args.skip_list:
+            print(f"{rate:>8} {'-':>14} {bucket_ns:>14.0f} {'-':>9}")
+            continue
+        list_ns = run(TimestampListRate, rate, args.messages)
+        print(f"{rate:>8} {list_ns:>14.0f} {bucket_ns:>14.0f} {list_ns / bucket_ns:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
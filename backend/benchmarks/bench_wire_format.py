@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: serialization CPU per chat message for each wire format.
+
+Measures encode and decode of a representative broadcast frame with the
+stdlib json module, the orjson-backed JSON path and msgpack. Formats whose
+library is not installed are skipped.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format  # noqa: E402
+
+
+def sample_message(size: int) -> dict:
+    return {
+        "sender": "user_1700000000000_123",
+        "message": "x" * size,
+        "type": "broadcast",
+        "room": "general",
+        "ts": 1700000000000,
+    }
+
+
+def formats():
+    """(name, encode, decode) for every wire format available here"""
+    available = [("json (stdlib)", json.dumps, json.loads)]
+    if wire_format.orjson is not None:
+        available.append(("json (orjson)", wire_format.dumps, wire_format.loads))
+    if wire_format.msgpack is not None:
+        codec = wire_format.CODECS["msgpack"]
+        available.append(("msgpack", codec.encode, codec.decode))
+    return available
+
+
+def measure(fn, arg, iterations: int) -> float:
+    """Nanoseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire format serialization microbenchmark")
+    parser.add_argument("--sizes", default="16,256,4096",
+                        help="Comma-separated message text sizes in bytes")
+    parser.add_argument("--iterations", type=int, default=100000,
+                        help="Encode and decode calls measured per format and size")
+
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'format':<15} {'size':>6} {'frame B':>8} {'encode ns':>10} {'decode ns':>10} {'total ns':>10}")
+    for size in sizes:
+        message = sample_message(size)
+        for name, encode, decode in formats():
+            frame = encode(message)
+            encode_ns = measure(encode, message, args.iterations)
+            decode_ns = measure(decode, frame, args.iterations)
+            print(f"{name:<15} {size:>6} {len(frame):>8} {encode_ns:>10.0f} "
+                  f"{decode_ns:>10.0f} {encode_ns + decode_ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
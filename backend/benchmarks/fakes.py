@@ -0,0 +1,236 @@
+"""
+In-process stand-ins for the backend's network dependencies, for benchmarks.
+
+``FakeRedis`` implements the part of ``redis.asyncio.Redis`` the backend uses
+(streams, pipelines, publish and an idle pub/sub) in memory. ``FakeWebSocket``
+and ``asgi_request`` are ASGI clients: they call the FastAPI app directly, so
+requests go through routing, middleware and the endpoints without a socket.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Entry = Tuple[str, Dict[str, str]]
+
+
+def _stream_id(text: str, missing_seq: int) -> Tuple[int, int]:
+    ms, _, seq = text.partition("-")
+    return int(ms), int(seq) if seq else missing_seq
+
+
+class FakeRedis:
+    """The Redis commands used by app.py, fanout.py and history.py, kept in memory"""
+
+    def __init__(self):
+        self.streams: Dict[str, List[Entry]] = defaultdict(list)
+        self.published = 0
+        self._last_id = (0, 0)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def publish(self, channel: str, message) -> int:
+        self.published += 1
+        return 0  # No other pods are subscribed
+
+    def pubsub(self, **kwargs) -> "FakePubSub":
+        return FakePubSub()
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def xadd(self, key: str, fields: Dict[str, str], maxlen: Optional[int] = None,
+                   approximate: bool = True) -> str:
+        return self._xadd(key, fields, maxlen)
+
+    def _xadd(self, key: str, fields: Dict[str, str], maxlen: Optional[int]) -> str:
+        ms = int(time.time() * 1000)
+        seq = self._last_id[1] + 1 if ms <= self._last_id[0] else 0
+        self._last_id = (max(ms, self._last_id[0]), seq)
+        entry_id = f"{self._last_id[0]}-{seq}"
+        stream = self.streams[key]
+        stream.append((entry_id, dict(fields)))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[:len(stream) - maxlen]
+        return entry_id
+
+    async def xrange(self, key: str, min: str = "-", max: str = "+",
+                     count: Optional[int] = None) -> List[Entry]:
+        return self._range(key, min, max)[:count]
+
+    async def xrevrange(self, key: str, max: str = "+", min: str = "-",
+                        count: Optional[int] = None) -> List[Entry]:
+        return self._range(key, min, max)[::-1][:count]
+
+    def _range(self, key: str, low: str, high: str) -> List[Entry]:
+        def above_low(entry_id: Tuple[int, int]) -> bool:
+            if low == "-":
+                return True
+            if low.startswith("("):
+                return entry_id > _stream_id(low[1:], 2**63)
+            return entry_id >= _stream_id(low, 0)
+
+        def below_high(entry_id: Tuple[int, int]) -> bool:
+            if high == "+":
+                return True
+            if high.startswith("("):
+                return entry_id < _stream_id(high[1:], 0)
+            return entry_id <= _stream_id(high, 2**63)
+
+        return [
+            (entry_id, fields) for entry_id, fields in self.streams.get(key, [])
+            if above_low(_stream_id(entry_id, 0)) and below_high(_stream_id(entry_id, 0))
+        ]
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self._commands: List[Tuple[str, Dict[str, str], Optional[int]]] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands.clear()
+
+    def xadd(self, key: str, fields: Dict[str, str], maxlen: Optional[int] = None,
+             approximate: bool = True):
+        self._commands.append((key, fields, maxlen))
+
+    async def execute(self, raise_on_error: bool = True) -> List[str]:
+        ids = [self.redis._xadd(*command) for command in self._commands]
+        self._commands.clear()
+        return ids
+
+
+class FakePubSub:
+    """A subscription that never receives anything: this is the only pod"""
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def listen(self):
+        await asyncio.Event().wait()
+        yield  # pragma: no cover - makes this an async generator
+
+    async def close(self):
+        pass
+
+
+class FakeWebSocket:
+    """Client end of a WebSocket connection served in-process by an ASGI app.
+
+    Received frames are counted; ``on_frame`` additionally sees each one.
+    """
+
+    def __init__(self, app, path: str, query: str = "",
+                 on_frame: Optional[Callable[[object], None]] = None):
+        self.app = app
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "subprotocols": [],
+            "server": ("bench", 80),
+            "client": ("127.0.0.1", 0),
+        }
+        self.on_frame = on_frame
+        self.frames = 0
+        self.bytes = 0
+        self.close_code: Optional[int] = None
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._accepted = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> bool:
+        """Open the connection; False if the app refused it"""
+        self._incoming.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(self.scope, self._incoming.get, self._send))
+        waiters = [asyncio.create_task(self._accepted.wait()),
+                   asyncio.create_task(self._closed.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        return self._accepted.is_set() and not self._closed.is_set()
+
+    def send_text(self, text: str):
+        self._incoming.put_nowait({"type": "websocket.receive", "text": text})
+
+    def send_bytes(self, data: bytes):
+        self._incoming.put_nowait({"type": "websocket.receive", "bytes": data})
+
+    async def close(self, code: int = 1000):
+        self._incoming.put_nowait({"type": "websocket.disconnect", "code": code})
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _send(self, message: dict):
+        kind = message["type"]
+        if kind == "websocket.send":
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes")
+            self.frames += 1
+            self.bytes += len(data)
+            if self.on_frame:
+                self.on_frame(data)
+        elif kind == "websocket.accept":
+            self._accepted.set()
+        elif kind == "websocket.close":
+            self.close_code = message.get("code", 1000)
+            self._closed.set()
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"",
+                       headers: Iterable[Tuple[str, str]] = ()) -> Tuple[int, bytes]:
+    """One HTTP request served in-process; returns the status and body"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-length", str(len(body)).encode())]
+                   + [(name.lower().encode(), value.encode()) for name, value in headers],
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    request_sent = False
+    response_done = asyncio.Event()
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive() -> dict:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected until the response is complete
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return status, b"".join(chunks)
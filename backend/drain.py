@@ -0,0 +1,120 @@
+import asyncio
+import glob
+import logging
+import os
+import random
+import signal
+from typing import List, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+draining_gauge = Gauge(
+    "chat_draining", "1 while this pod is draining its connections", multiprocess_mode="livemax"
+)
+drained_connections = Counter(
+    "chat_drained_connections_total", "Connections closed with a reconnect hint while draining"
+)
+
+# 1012 "Service Restart": the client should reconnect, to another pod
+DRAIN_CLOSE_CODE = 1012
+
+
+def reconnect_hint(delay: float) -> dict:
+    return {"type": "reconnect", "delay_ms": int(delay * 1000)}
+
+
+class ConnectionDrainer:
+    """Moves a terminating pod's clients to the remaining pods without a thundering herd.
+
+    Once draining, new sockets are refused. Existing connections are closed in
+    shuffled batches spread evenly over ``window`` seconds; each client first
+    gets a reconnect hint with a random delay of up to ``jitter`` seconds, so
+    even one batch does not reconnect in lockstep.
+    """
+
+    def __init__(self, manager, window: float = 20.0, batch_size: int = 50,
+                 jitter: float = 5.0, rng: Optional[random.Random] = None):
+        self.manager = manager
+        self.window = window
+        self.batch_size = batch_size
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.draining = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        """Begin draining; repeated calls return the drain already in progress"""
+        if self._task is None:
+            self.draining = True
+            draining_gauge.set(1)
+            self._task = asyncio.create_task(self._drain())
+        return self._task
+
+    async def _drain(self):
+        connections = list(self.manager.active_connections.values())
+        self.rng.shuffle(connections)
+        batches: List[list] = [
+            connections[i:i + self.batch_size]
+            for i in range(0, len(connections), self.batch_size)
+        ]
+        interval = self.window / max(len(batches), 1)
+        logger.info(
+            f"Draining {len(connections)} connections in {len(batches)} batches "
+            f"every {interval:.2f}s"
+        )
+
+        for index, batch in enumerate(batches):
+            for connection in batch:
+                connection.send(reconnect_hint(self.rng.uniform(0, self.jitter)))
+                connection.close_after_flush(DRAIN_CLOSE_CODE, "server draining")
+            drained_connections.inc(len(batch))
+            if index < len(batches) - 1:
+                await asyncio.sleep(interval)
+
+        logger.info("Drain complete")
+
+
+def signal_sibling_workers():
+    """SIGTERM every worker started by this process's parent, this one included.
+
+    The uvicorn supervisor stops workers one at a time, so a pod-wide drain
+    started there would take one drain window per worker.
+    """
+    parent = os.getppid()
+    for stat_path in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat_path) as f:
+                # pid (comm) state ppid ...; comm may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent:
+            pid = int(stat_path.split("/")[2])
+            os.kill(pid, signal.SIGTERM)
+
+
+def install_sigterm_drain(drainer: ConnectionDrainer):
+    """Drain on SIGTERM before letting the server shut down.
+
+    The server's own SIGTERM handling is deferred until the drain finishes; it
+    is then asked to exit with SIGINT, which uvicorn treats as a graceful stop.
+    """
+    loop = asyncio.get_running_loop()
+
+    def exit_server():
+        loop.remove_signal_handler(signal.SIGTERM)
+        signal.raise_signal(signal.SIGINT)
+
+    def on_sigterm():
+        logger.info("SIGTERM received, draining connections")
+        drainer.start().add_done_callback(lambda _: exit_server())
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, on_sigterm)
+    except (RuntimeError, ValueError, NotImplementedError) as e:
+        # Not the main thread (e.g. an in-process test client; uvloop raises
+        # ValueError where asyncio raises RuntimeError); rely on preStop
+        logger.warning(f"SIGTERM drain not installed: {e}")
+
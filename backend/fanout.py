@@ -0,0 +1,114 @@
+import asyncio
+import os
+import uuid
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+import redis.asyncio as redis
+from prometheus_client import Counter, Histogram
+
+from wire_format import dumps, loads
+
+POD_ID = os.getenv("HOSTNAME") or uuid.uuid4().hex
+WORKER_ID = f"{POD_ID}:{os.getpid()}"
+
+fanout_published = Counter(
+    "chat_fanout_published_total", "Messages published to other pods"
+)
+fanout_received = Counter(
+    "chat_fanout_received_total", "Messages received from other pods"
+)
+fanout_dropped = Counter(
+    "chat_fanout_dropped_total", "Messages dropped before publishing", ["reason"]
+)
+fanout_batch_size = Histogram(
+    "chat_fanout_batch_size", "Messages per pub/sub publish",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+
+class RedisFanout:
+    """Cross-pod broadcast over Redis pub/sub.
+
+    Every message is published once with this pod's id; each pod delivers what
+    it receives to its local members of the message's room and ignores its own
+    echoes. Messages queued
+    while a publish is in flight go out together in the next one.
+    """
+
+    def __init__(self, redis_client: redis.Redis, channel: str,
+                 deliver: Callable[[str, str, str], None],
+                 max_pending: int = 10000, max_batch: int = 500,
+                 pod_id: str = POD_ID):
+        self.redis = redis_client
+        self.pod_id = pod_id
+        self.channel = channel
+        self.deliver = deliver
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._pending: Deque[Tuple[str, str, str]] = deque()
+        self._ready = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._publisher()),
+            asyncio.create_task(self._subscriber()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def publish(self, room: str, sender_id: str, payload: str):
+        """Queue an encoded broadcast for the other pods without awaiting Redis"""
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            fanout_dropped.labels(reason="overflow").inc()
+        self._pending.append((room, sender_id, payload))
+        self._ready.set()
+
+    async def _publisher(self):
+        while True:
+            await self._ready.wait()
+            batch = [
+                self._pending.popleft()
+                for _ in range(min(self.max_batch, len(self._pending)))
+            ]
+            if not self._pending:
+                self._ready.clear()
+
+            envelope = dumps({"origin": self.pod_id, "messages": batch})
+            try:
+                await self.redis.publish(self.channel, envelope)
+                fanout_published.inc(len(batch))
+                fanout_batch_size.observe(len(batch))
+            except Exception:
+                fanout_dropped.labels(reason="publish_error").inc(len(batch))
+
+    async def _subscriber(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    self._handle(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(1)  # Redis unavailable, resubscribe
+            finally:
+                await pubsub.close()
+
+    def _handle(self, data: Optional[str]):
+        if not data:
+            return
+        envelope = loads(data)
+        if envelope.get("origin") == self.pod_id:
+            return  # Already delivered locally
+
+        messages = envelope.get("messages", [])
+        fanout_received.inc(len(messages))
+        for room, sender_id, payload in messages:
+            self.deliver(payload, sender_id, room)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import DataError
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+history_batch_size = Histogram(
+    "chat_history_flush_batch_size", "Messages written per history flush",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+history_flush_latency = Histogram(
+    "chat_history_flush_duration_seconds", "Redis round trip per history flush"
+)
+history_dropped = Counter(
+    "chat_history_dropped_total", "History records dropped before reaching Redis", ["reason"]
+)
+
+
+def _entry(entry_id: str, fields: Dict[str, str]) -> dict:
+    return {"id": entry_id, **fields, "ts": int(fields.get("ts", 0))}
+
+
+async def read_page(redis_client: redis.Redis, key: str, before: Optional[str] = None,
+                    limit: int = 50) -> List[dict]:
+    """Newest-first page of a history stream, strictly older than ``before``"""
+    entries = await redis_client.xrevrange(
+        key, max=f"({before}" if before else "+", min="-", count=limit
+    )
+    return [_entry(entry_id, fields) for entry_id, fields in entries]
+
+
+async def read_since(redis_client: redis.Redis, key: str, since: str,
+                     limit: int = 500) -> List[dict]:
+    """Oldest-first entries after ``since``, a stream ID or a millisecond timestamp.
+
+    Entries are added when their batch is flushed, so an entry's ID is never
+    older than its ``ts`` field; for a timestamp cursor, scan from that
+    millisecond and filter on ``ts``.
+    """
+    if "-" in since:
+        entries = await redis_client.xrange(key, min=f"({since}", max="+", count=limit)
+        return [_entry(entry_id, fields) for entry_id, fields in entries]
+
+    since_ms = int(since)
+    entries = await redis_client.xrange(key, min=str(since_ms), max="+", count=limit)
+    return [
+        entry for entry in (_entry(entry_id, fields) for entry_id, fields in entries)
+        if entry["ts"] > since_ms
+    ]
+
+
+class HistoryWriter:
+    """Group-commit writer for the chat history streams.
+
+    Records are buffered in memory and written by a background task as one
+    pipeline of XADDs with approximate MAXLEN trimming, once ``batch_size``
+    records are pending or ``flush_interval`` seconds after the first one.
+    """
+
+    def __init__(self, redis_client: redis.Redis, max_length: int = 1000,
+                 batch_size: int = 100, flush_interval: float = 0.05,
+                 max_buffer: int = 10000):
+        self.redis = redis_client
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Tuple[str, Dict[str, str]]] = deque()
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    def append(self, key: str, fields: Dict[str, str]):
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            history_dropped.labels(reason="overflow").inc()
+        self._buffer.append((key, fields))
+        self._pending.set()
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+
+        batch = list(self._buffer)
+        count = len(batch)
+        self._buffer.clear()
+        self._pending.clear()
+        self._full.clear()
+
+        try:
+            with history_flush_latency.time():
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, fields in batch:
+                        # MAXLEN ~ trims whole macro nodes, far cheaper than exact trimming
+                        pipe.xadd(key, fields, maxlen=self.max_length, approximate=True)
+                    # Without a transaction every command runs; collect the errors
+                    # instead of raising the first, as the others are already written
+                    results = await pipe.execute(raise_on_error=False)
+            history_batch_size.observe(count)
+        except DataError:
+            # Raised while encoding the pipeline, before anything was sent
+            await self._write_each(batch)
+            return
+        except Exception as e:
+            logger.error(f"History flush of {count} records failed: {e}")
+            history_dropped.labels(reason="redis_error").inc(count)
+            return
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.error(f"History flush: Redis refused {len(errors)} of {count} records: {errors[0]}")
+            history_dropped.labels(reason="redis_error").inc(len(errors))
+
+    async def _write_each(self, batch: List[Tuple[str, Dict[str, str]]]):
+        """Write records one at a time, so only those that can't be encoded are dropped"""
+        for key, fields in batch:
+            try:
+                await self.redis.xadd(key, fields, maxlen=self.max_length, approximate=True)
+            except DataError:
+                history_dropped.labels(reason="invalid").inc()
+            except Exception as e:
+                logger.error(f"History write failed: {e}")
+                history_dropped.labels(reason="redis_error").inc()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from prometheus_client import Gauge, Histogram
+
+from shared_metrics import live_gauges
+
+event_loop_lag = Histogram(
+    "chat_event_loop_lag_seconds", "Delay between a scheduled wakeup and the loop running it",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+event_loop_lag_max = Gauge(
+    "chat_event_loop_lag_max_seconds", "Largest event loop lag over the recent window",
+    multiprocess_mode="livemax"
+)
+fanout_latency = Histogram(
+    "chat_broadcast_fanout_seconds", "Time to hand a broadcast to every local member's send queue",
+    ["origin"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+requests_in_flight = Gauge(
+    "chat_http_requests_in_flight", "HTTP requests currently being handled",
+    multiprocess_mode="livesum"
+)
+
+
+class LatencyWindow:
+    """Most recent latency samples, for percentiles in /stats without reading metric internals"""
+
+    def __init__(self, size: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "count": len(ordered),
+            "p50": ordered[int(0.5 * (len(ordered) - 1))],
+            "p99": ordered[int(0.99 * (len(ordered) - 1))],
+            "max": ordered[-1],
+        }
+
+
+class EventLoopLagMonitor:
+    """Sleeps for a fixed interval and records how late the loop wakes it up.
+
+    Lag grows as soon as the loop is saturated, well before message rates
+    or CPU usage flatten out, so it is the earliest signal that a pod is full.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 50):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        live_gauges.register(event_loop_lag_max, self.max_lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    @property
+    def last_lag(self) -> float:
+        return self.samples[-1] if self.samples else 0.0
+
+    def max_lag(self) -> float:
+        return max(self.samples, default=0.0)
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            event_loop_lag.observe(lag)
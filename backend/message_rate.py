@@ -0,0 +1,40 @@
+import time
+from typing import Callable, List
+
+
+class MessageRateCounter:
+    """Ring of per-second buckets: O(1) increments and cheap windowed rates"""
+
+    def __init__(self, window_seconds: int = 60, clock: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.clock = clock
+        # One extra bucket holds the second in progress
+        self._size = window_seconds + 1
+        self._counts: List[int] = [0] * self._size
+        self._seconds: List[int] = [-1] * self._size
+        self.total = 0
+
+    def increment(self, count: int = 1):
+        self.total += count
+        second = int(self.clock())
+        index = second % self._size
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._counts[index] = 0
+        self._counts[index] += count
+
+    def count(self, window_seconds: int) -> int:
+        """Messages in the last ``window_seconds`` completed seconds"""
+        if not 0 < window_seconds <= self.window_seconds:
+            raise ValueError(f"Window must be between 1 and {self.window_seconds} seconds")
+
+        current = int(self.clock())
+        total = 0
+        for second in range(current - window_seconds, current):
+            index = second % self._size
+            if self._seconds[index] == second:
+                total += self._counts[index]
+        return total
+
+    def rate(self, window_seconds: int) -> float:
+        return self.count(window_seconds) / window_seconds
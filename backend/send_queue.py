@@ -0,0 +1,108 @@
+import asyncio
+from collections import deque
+from enum import Enum
+from typing import Deque, Optional, Tuple
+
+from fastapi import WebSocket
+from prometheus_client import Counter
+
+from wire_format import JSON, Frame
+
+send_queue_dropped = Counter(
+    "chat_send_queue_dropped_total", "Messages dropped from full per-connection send queues"
+)
+slow_consumer_disconnects = Counter(
+    "chat_slow_consumer_disconnects_total", "Connections closed because their send queue overflowed"
+)
+
+
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"  # Discard the oldest queued message
+    COALESCE = "coalesce"  # Send the backlog as one batch frame, discarding the oldest when full
+    DISCONNECT = "disconnect"  # Close the slow consumer's connection
+
+
+class ClientConnection:
+    """WebSocket with a bounded outbound queue drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, client_id: str, room: str, max_queue: int,
+                 overflow_policy: OverflowPolicy, codec=JSON):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.room = room
+        self.codec = codec  # Wire format negotiated by this client
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.queue: Deque[Frame] = deque()
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self._close_after_flush: Optional[Tuple[int, str]] = None
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def stop(self):
+        self.closed = True
+        if self._writer_task:
+            self._writer_task.cancel()
+
+    def close_after_flush(self, code: int, reason: str):
+        """Close the socket once every frame queued so far has been sent"""
+        self._close_after_flush = (code, reason)
+        self._ready.set()
+
+    def send(self, obj) -> bool:
+        """Encode a message for this connection alone and queue it"""
+        return self.enqueue(self.codec.encode(obj))
+
+    def enqueue(self, payload: Frame) -> bool:
+        """Queue an encoded frame without awaiting; False once the connection is closed"""
+        if self.closed:
+            return False
+        if self._close_after_flush:
+            return True  # Closing on purpose, not a slow consumer; drop the frame
+
+        if len(self.queue) >= self.max_queue:
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                slow_consumer_disconnects.inc()
+                self.stop()
+                self._close_task = asyncio.create_task(
+                    self.websocket.close(code=1008, reason="slow consumer")
+                )
+                return False
+            self.queue.popleft()
+            send_queue_dropped.inc()
+
+        self.queue.append(payload)
+        self._ready.set()
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if not self.queue:
+                    # Only woken without frames to close after a flush
+                    code, reason = self._close_after_flush
+                    self.closed = True
+                    await self.websocket.close(code=code, reason=reason)
+                    return
+                if self.overflow_policy == OverflowPolicy.COALESCE and len(self.queue) > 1:
+                    payload = self.codec.batch(list(self.queue))
+                    self.queue.clear()
+                else:
+                    payload = self.queue.popleft()
+                if not self.queue and not self._close_after_flush:
+                    self._ready.clear()
+
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Client went away; the receive loop handles the disconnect
+            self.closed = True
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import REGISTRY, CollectorRegistry, Gauge, multiprocess
+
+# Set by the container entrypoint when uvicorn runs several workers per pod;
+# counters and histograms are then written to per-process files in this
+# directory and summed at scrape time
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class LiveGauges:
+    """Gauges whose value is derived from in-process state.
+
+    With one process they are computed at scrape time with ``set_function``.
+    Multiprocess mode cannot call into other workers at scrape time, so each
+    worker instead writes its values every ``interval`` seconds and the
+    gauge's ``multiprocess_mode`` (livesum, livemax) combines them.
+    """
+
+    def __init__(self):
+        self._functions: List[Tuple[Gauge, Callable[[], float]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, gauge: Gauge, fn: Callable[[], float]):
+        if MULTIPROCESS:
+            self._functions.append((gauge, fn))
+        else:
+            gauge.set_function(fn)
+
+    def refresh(self):
+        for gauge, fn in self._functions:
+            gauge.set(fn())
+
+    def start(self, interval: float = 1.0):
+        if self._functions:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self, interval: float):
+        while True:
+            self.refresh()
+            await asyncio.sleep(interval)
+
+
+live_gauges = LiveGauges()
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose on /metrics: this process, or every worker in the pod"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def pod_totals(names: Iterable[str]) -> Dict[str, float]:
+    """Unlabelled sample values for ``names``, combined across workers"""
+    wanted = set(names)
+    totals = {name: 0.0 for name in wanted}
+    for metric in metrics_registry().collect():
+        for sample in metric.samples:
+            if sample.name in wanted and not sample.labels:
+                totals[sample.name] += sample.value
+    return totals
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges from the pod's totals"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
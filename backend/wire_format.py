@@ -0,0 +1,88 @@
+import json
+from typing import Any, Dict, List, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack clients are refused
+    msgpack = None
+
+Frame = Union[str, bytes]
+
+
+def dumps(obj: Any) -> str:
+    """JSON text, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JsonCodec:
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, obj: Any) -> str:
+        return dumps(obj)
+
+    def decode(self, data: Frame) -> Any:
+        return loads(data)
+
+    def batch(self, frames: List[str]) -> str:
+        """Wrap already-encoded frames in one batch frame without re-encoding them"""
+        return '{"type":"batch","messages":[' + ",".join(frames) + "]}"
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj)
+
+    def decode(self, data: Frame) -> Any:
+        if isinstance(data, str):
+            raise ValueError("msgpack frames must be binary")
+        return msgpack.unpackb(data)
+
+    def batch(self, frames: List[bytes]) -> bytes:
+        # A msgpack array is its header followed by the packed items, so the
+        # already-encoded frames are concatenated rather than re-encoded
+        packer = msgpack.Packer()
+        return b"".join([
+            packer.pack_map_header(2),
+            packer.pack("type"), packer.pack("batch"),
+            packer.pack("messages"), packer.pack_array_header(len(frames)),
+            *frames,
+        ])
+
+
+JSON = JsonCodec()
+CODECS: Dict[str, Union[JsonCodec, MsgpackCodec]] = {"json": JSON}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def codec_for(encoding: str):
+    """Codec for a negotiated encoding name; ValueError if it is unknown or not installed"""
+    try:
+        return CODECS[encoding]
+    except KeyError:
+        raise ValueError(f"Unsupported encoding {encoding!r}, expected one of {sorted(CODECS)}")
+
+
+def codec_for_content_type(content_type: str):
+    """Codec for an HTTP Content-Type or Accept value, JSON when nothing else matches"""
+    for codec in CODECS.values():
+        if codec.content_type in (content_type or ""):
+            return codec
+    return JSON
@@ -1,8 +1,9 @@
+import asyncio
 import json
 import logging
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -24,15 +25,26 @@ REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 FORECAST_HORIZON_MINUTES = int(os.getenv("FORECAST_HORIZON_MINUTES", "10"))
 HISTORY_HOURS = int(os.getenv("HISTORY_HOURS", "24"))
 MIN_TRAINING_POINTS = 10
+CURRENT_VALUE_TTL_SECONDS = float(os.getenv("CURRENT_VALUE_TTL_SECONDS", "5"))
 
 redis_client = redis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)
 
 
+class MetricsUnavailable(Exception):
+    """Prometheus could not be queried"""
+
+
 class ForecastRequest(BaseModel):
     metric_name: str = "chat_messages_per_second"
     horizon_minutes: int = FORECAST_HORIZON_MINUTES
 
 
+class CurrentValueResponse(BaseModel):
+    metric_name: str
+    current_value: float
+    timestamp: str
+
+
 class ForecastResponse(BaseModel):
     current_value: float
     predicted_values: List[float]
@@ -47,6 +59,12 @@ class LoadForecaster:
         self.last_training_time = None
         self.training_interval_minutes = 10
         self.scaler = StandardScaler()
+        self._current_cache: Dict[str, Tuple[datetime, float]] = {}
+        self._current_locks: Dict[str, asyncio.Lock] = {}
+
+    def now(self) -> datetime:
+        """Clock used for retraining decisions (overridable for offline simulation)"""
+        return datetime.utcnow()
 
     async def get_current_value(self, metric_name: str) -> float:
         """Get current aggregated value across all pods"""
@@ -62,20 +80,42 @@ class LoadForecaster:
             async with aiohttp.ClientSession() as session:
                 async with session.get(url, params=params) as response:
                     logger.info(f"Prometheus query: {query}, status: {response.status}")
-                    if response.status == 200:
-                        data = await response.json()
-                        result = data.get('data', {}).get('result', [])
-                        logger.info(f"Prometheus result: {result}")
-                        if result and len(result) > 0:
-                            value = float(result[0]['value'][1])
-                            logger.info(f"Current value: {value}")
-                            return value
+                    if response.status != 200:
+                        raise MetricsUnavailable(f"Prometheus returned status {response.status}")
+                    data = await response.json()
+        except MetricsUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Failed to fetch current value: {e}")
+            raise MetricsUnavailable(f"Prometheus query failed: {e}") from e
+        
+        result = data.get('data', {}).get('result', [])
+        logger.info(f"Prometheus result: {result}")
+        if result:
+            value = float(result[0]['value'][1])
+            logger.info(f"Current value: {value}")
+            return value
         
+        # Prometheus answered, but no pod exports the metric
         logger.warning(f"No current value found, returning 0.0")
         return 0.0
 
+    async def get_cached_current_value(self, metric_name: str) -> Tuple[float, datetime]:
+        """Current value served from a short-TTL cache; concurrent misses share one query.
+
+        Failures raise MetricsUnavailable and are not cached.
+        """
+        lock = self._current_locks.setdefault(metric_name, asyncio.Lock())
+        async with lock:
+            cached = self._current_cache.get(metric_name)
+            if cached and (self.now() - cached[0]).total_seconds() < CURRENT_VALUE_TTL_SECONDS:
+                return cached[1], cached[0]
+            
+            value = await self.get_current_value(metric_name)
+            sampled_at = self.now()
+            self._current_cache[metric_name] = (sampled_at, value)
+            return value, sampled_at
+
     async def fetch_prometheus_metrics(self, metric_name: str) -> pd.DataFrame:
         import aiohttp
         
@@ -163,7 +203,7 @@ class LoadForecaster:
         
         model.fit(data)
         self.model = model
-        self.last_training_time = datetime.utcnow()
+        self.last_training_time = self.now()
         
         # Store model metadata in Redis
         redis_client.set(
@@ -195,7 +235,7 @@ class LoadForecaster:
         should_retrain = (
             self.model is None or 
             self.last_training_time is None or
-            (datetime.utcnow() - self.last_training_time).total_seconds() > self.training_interval_minutes * 60
+            (self.now() - self.last_training_time).total_seconds() > self.training_interval_minutes * 60
         )
         
         if should_retrain:
@@ -208,7 +248,7 @@ class LoadForecaster:
                 self.train_model(data)
         
         # Get current value from live metrics
-        current_value = await self.get_current_value(metric_name)
+        current_value, _ = await self.get_cached_current_value(metric_name)
         
         # Make predictions
         predictions = self.predict(horizon_minutes)
@@ -255,6 +295,24 @@ async def get_forecast(request: ForecastRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/current", response_model=CurrentValueResponse)
+async def get_current(metric_name: str = "chat_messages_per_second"):
+    """Live aggregated value without training or prediction"""
+    try:
+        value, sampled_at = await forecaster.get_cached_current_value(metric_name)
+        return CurrentValueResponse(
+            metric_name=metric_name,
+            current_value=value,
+            timestamp=sampled_at.isoformat()
+        )
+    except MetricsUnavailable as e:
+        logger.error(f"Current value unavailable: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Current value failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/metrics")
 async def metrics():
     from starlette.responses import Response
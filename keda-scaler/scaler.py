@@ -1,14 +1,17 @@
-import asyncio
 import json
 import logging
+import math
 import os
+import threading
+import time
 from concurrent import futures
 from datetime import datetime
-from typing import Iterator
+from typing import Callable, Iterator, Optional
 
 import grpc
 import requests
 from google.protobuf import empty_pb2
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
 import externalscaler_pb2
 import externalscaler_pb2_grpc
@@ -17,206 +20,441 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 FORECASTER_URL = os.getenv("FORECASTER_URL", "http://forecaster:8001")
+PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
 METRIC_NAME = os.getenv("METRIC_NAME", "chat_messages_per_second")
 FORECAST_MINUTES = int(os.getenv("FORECAST_MINUTES", "5"))
 TARGET_VALUE = float(os.getenv("TARGET_VALUE", "10"))  # Messages per pod
 MIN_REPLICAS = int(os.getenv("MIN_REPLICAS", "1"))
 MAX_REPLICAS = int(os.getenv("MAX_REPLICAS", "20"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8080"))
+FORECASTER_TIMEOUT = float(os.getenv("FORECASTER_TIMEOUT", "5"))
+PROMETHEUS_TIMEOUT = float(os.getenv("PROMETHEUS_TIMEOUT", "2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "15"))
+LKG_MAX_AGE_SECONDS = float(os.getenv("LKG_MAX_AGE_SECONDS", "300"))  # Serve last good forecast this long
+LKG_HALF_LIFE_SECONDS = float(os.getenv("LKG_HALF_LIFE_SECONDS", "600"))  # Decay of a stale forecast
 
+# Prometheus metrics
+rpc_latency = Histogram(
+    "scaler_rpc_duration_seconds", "External scaler gRPC handler latency", ["method"]
+)
+forecaster_latency = Histogram(
+    "scaler_forecaster_request_duration_seconds", "Forecaster request latency", ["endpoint"]
+)
+forecaster_errors = Counter(
+    "scaler_forecaster_errors_total", "Failed forecaster requests", ["reason"]
+)
+fallbacks_total = Counter(
+    "scaler_fallbacks_total", "Responses served without any forecast source", ["method"]
+)
+forecast_age = Gauge(
+    "scaler_forecast_age_seconds",
+    "Seconds since the last successful answer from each forecaster endpoint", ["endpoint"]
+)
+forecast_source_total = Counter(
+    "scaler_forecast_source_total", "Forecasts served per source", ["source"]
+)
+breaker_open_gauge = Gauge(
+    "scaler_circuit_breaker_open", "1 while a forecaster endpoint's circuit breaker is open",
+    ["endpoint"]
+)
+predicted_load_gauge = Gauge(
+    "scaler_predicted_load", "Load used for the last scaling decision"
+)
+desired_replicas_gauge = Gauge(
+    "scaler_desired_replicas", "Replica count implied by the last reported metric"
+)
 
-class ExternalScaler(externalscaler_pb2_grpc.ExternalScalerServicer):
-    
-    def IsActive(self, request, context):
-        try:
-            response = requests.post(
-                f"{FORECASTER_URL}/forecast",
-                json={
-                    "metric_name": METRIC_NAME,
-                    "horizon_minutes": FORECAST_MINUTES
-                },
-                timeout=5
+
+def desired_replicas_for(load: float) -> int:
+    """Replica count needed to serve ``load`` at TARGET_VALUE per pod"""
+    return max(
+        MIN_REPLICAS,
+        min(MAX_REPLICAS, int(load / TARGET_VALUE) + 1)
+    )
+
+
+def predicted_load_response(metric_value: float) -> externalscaler_pb2.GetMetricsResponse:
+    # HPA derives replicas as ceil(metric_value / target_size)
+    desired_replicas_gauge.set(math.ceil(metric_value / TARGET_VALUE))
+    return externalscaler_pb2.GetMetricsResponse(
+        metrics=[
+            externalscaler_pb2.MetricValue(
+                metric_name="predicted_load",
+                metric_value=int(metric_value)
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                current_value = data.get('current_value', 0)
-                max_predicted = current_value
-                is_active = True  # Always active to respect minReplicaCount
-                
-                logger.info(f"IsActive check: max_predicted={max_predicted}, active={is_active}")
-                
-                return externalscaler_pb2.IsActiveResponse(result=is_active)
-            else:
-                logger.error(f"Forecaster returned status {response.status_code}")
-                return externalscaler_pb2.IsActiveResponse(result=True)
-                
-        except Exception as e:
-            logger.error(f"IsActive failed: {e}")
-            return externalscaler_pb2.IsActiveResponse(result=True)
+        ]
+    )
+
+
+class ForecasterUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures so callers fail fast until a probe succeeds"""
     
-    def StreamIsActive(self, request, context):
-        while True:
-            try:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float,
+                 clock: Callable[[], float] = time.time, endpoint: str = "forecast"):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        return self.state == self.CLOSED
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit breaker for /{self.endpoint} closed, forecaster recovered")
+            self.state = self.CLOSED
+            breaker_open_gauge.labels(endpoint=self.endpoint).set(0)
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                if self.state == self.CLOSED:
+                    logger.warning(
+                        f"Circuit breaker for /{self.endpoint} opened after {self.failures} failures"
+                    )
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                breaker_open_gauge.labels(endpoint=self.endpoint).set(1)
+    
+    def try_begin_probe(self) -> bool:
+        """Move an open breaker to half-open once the reset timeout has elapsed"""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+
+class ForecasterClient:
+    """Forecaster access with a circuit breaker per endpoint and two fallback tiers:
+    the decayed last known good value, then a direct Prometheus query.
+
+    /forecast and /current fail independently (training can fail while the live
+    value is fine), so each has its own breaker and its own last known good.
+    """
+    
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.breakers = {
+            endpoint: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS, clock, endpoint)
+            for endpoint in ("forecast", "current")
+        }
+        self.last_forecast: Optional[dict] = None
+        self.last_forecast_time: Optional[float] = None
+        self.last_current: Optional[float] = None
+        self.last_current_time: Optional[float] = None
+    
+    def request_forecast(self) -> dict:
+        try:
+            with forecaster_latency.labels(endpoint="forecast").time():
                 response = requests.post(
                     f"{FORECASTER_URL}/forecast",
                     json={
                         "metric_name": METRIC_NAME,
                         "horizon_minutes": FORECAST_MINUTES
                     },
-                    timeout=5
+                    timeout=FORECASTER_TIMEOUT
                 )
+        except Exception as e:
+            forecaster_errors.labels(reason=type(e).__name__).inc()
+            raise
+        
+        if response.status_code != 200:
+            forecaster_errors.labels(reason="http_status").inc()
+            raise ForecasterUnavailable(f"Forecaster returned status {response.status_code}")
+        return response.json()
+    
+    def request_current(self) -> dict:
+        """Live value only; the forecaster answers from a short-TTL cache"""
+        try:
+            with forecaster_latency.labels(endpoint="current").time():
+                response = requests.get(
+                    f"{FORECASTER_URL}/current",
+                    params={"metric_name": METRIC_NAME},
+                    timeout=FORECASTER_TIMEOUT
+                )
+        except Exception as e:
+            forecaster_errors.labels(reason=type(e).__name__).inc()
+            raise
+        
+        if response.status_code != 200:
+            forecaster_errors.labels(reason="http_status").inc()
+            raise ForecasterUnavailable(f"Forecaster returned status {response.status_code}")
+        return response.json()
+    
+    def query_prometheus(self) -> float:
+        response = requests.get(
+            f"{PROMETHEUS_URL}/api/v1/query",
+            params={"query": f"sum({METRIC_NAME})"},
+            timeout=PROMETHEUS_TIMEOUT
+        )
+        response.raise_for_status()
+        result = response.json().get('data', {}).get('result', [])
+        if not result:
+            raise ValueError(f"No Prometheus data for {METRIC_NAME}")
+        return float(result[0]['value'][1])
+    
+    def forecast_age(self) -> float:
+        if self.last_forecast_time is None:
+            return float("nan")
+        return self.clock() - self.last_forecast_time
+    
+    def current_age(self) -> float:
+        """Age of the live value, which GetMetrics and IsActive scale on"""
+        if self.last_current_time is None:
+            return float("nan")
+        return self.clock() - self.last_current_time
+    
+    def _call_forecaster(self, current_only: bool = False) -> dict:
+        endpoint = "current" if current_only else "forecast"
+        breaker = self.breakers[endpoint]
+        try:
+            data = self.request_current() if current_only else self.request_forecast()
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        now = self.clock()
+        if not current_only:
+            self.last_forecast = data
+            self.last_forecast_time = now
+        # A forecast carries the live value too
+        self.last_current = data['current_value']
+        self.last_current_time = now
+        return data
+    
+    def probe_if_due(self):
+        """Retry each endpoint whose open breaker's reset timeout has elapsed"""
+        for endpoint, breaker in self.breakers.items():
+            if not breaker.try_begin_probe():
+                continue
+            try:
+                self._call_forecaster(current_only=endpoint == "current")
+            except Exception as e:
+                logger.warning(f"Forecaster probe of /{endpoint} failed: {e}")
+    
+    def start_prober(self, interval: float = 1.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                self.probe_if_due()
+        
+        threading.Thread(target=run, name="forecaster-prober", daemon=True).start()
+    
+    def _last_known_good(self, current_only: bool = False) -> Optional[dict]:
+        """The last good answer of the same kind, decayed by its own age"""
+        if current_only:
+            if self.last_current is None:
+                return None
+            age = self.current_age()
+            last_good = {'current_value': self.last_current, 'predicted_values': [self.last_current]}
+        else:
+            if self.last_forecast is None:
+                return None
+            age = self.forecast_age()
+            last_good = self.last_forecast
+        if age > LKG_MAX_AGE_SECONDS:
+            return None
+        
+        decay = 0.5 ** (age / LKG_HALF_LIFE_SECONDS)
+        data = dict(last_good)
+        data['current_value'] = data.get('current_value', 0) * decay
+        data['predicted_values'] = [v * decay for v in data.get('predicted_values', [])]
+        return data
+    
+    def fetch(self, current_only: bool = False) -> Optional[dict]:
+        """Forecast from the best available source; None when every tier failed"""
+        if self.breakers["current" if current_only else "forecast"].allow_request():
+            try:
+                data = self._call_forecaster(current_only)
+                forecast_source_total.labels(source="forecaster").inc()
+                return data
+            except Exception as e:
+                logger.error(f"Forecaster request failed: {e}")
+        
+        data = self._last_known_good(current_only)
+        if data is not None:
+            forecast_source_total.labels(source="last_known_good").inc()
+            return data
+        
+        try:
+            current_value = self.query_prometheus()
+            forecast_source_total.labels(source="prometheus").inc()
+            return {'current_value': current_value, 'predicted_values': [current_value]}
+        except Exception as e:
+            logger.error(f"Prometheus fallback failed: {e}")
+        
+        return None
+
+
+class ExternalScaler(externalscaler_pb2_grpc.ExternalScalerServicer):
+    
+    def __init__(self, forecaster_client: Optional[ForecasterClient] = None):
+        self.forecaster_client = forecaster_client or ForecasterClient()
+        self.last_metric_values = {}  # method -> last metric value reported from a forecast
+        forecast_age.labels(endpoint="forecast").set_function(self.forecaster_client.forecast_age)
+        forecast_age.labels(endpoint="current").set_function(self.forecaster_client.current_age)
+    
+    def report(self, method: str, metric_value: float) -> externalscaler_pb2.GetMetricsResponse:
+        self.last_metric_values[method] = metric_value
+        return predicted_load_response(metric_value)
+    
+    def hold(self, method: str) -> externalscaler_pb2.GetMetricsResponse:
+        """Every source failed: keep the current scale rather than dropping to one replica"""
+        fallbacks_total.labels(method=method).inc()
+        return predicted_load_response(self.last_metric_values.get(method, TARGET_VALUE))
+    
+    def fetch_forecast(self, current_only: bool = False) -> Optional[dict]:
+        """Forecast via the circuit-broken client; returns None when no source is available.
+        
+        ``current_only`` asks for the live value alone, skipping training and prediction.
+        """
+        return self.forecaster_client.fetch(current_only)
+    
+    def IsActive(self, request, context):
+        with rpc_latency.labels(method="IsActive").time():
+            try:
+                data = self.fetch_forecast(current_only=True)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    max_predicted = max(data.get('predicted_values', [0]))
-                    is_active = max_predicted > TARGET_VALUE
+                if data is not None:
+                    current_value = data.get('current_value', 0)
+                    max_predicted = current_value
+                    is_active = True  # Always active to respect minReplicaCount
                     
-                    logger.info(f"StreamIsActive: max_predicted={max_predicted}, active={is_active}")
+                    logger.info(f"IsActive check: max_predicted={max_predicted}, active={is_active}")
                     
-                    yield externalscaler_pb2.IsActiveResponse(result=is_active)
+                    return externalscaler_pb2.IsActiveResponse(result=is_active)
                 else:
-                    yield externalscaler_pb2.IsActiveResponse(result=True)
+                    fallbacks_total.labels(method="IsActive").inc()
+                    return externalscaler_pb2.IsActiveResponse(result=True)
                     
             except Exception as e:
-                logger.error(f"StreamIsActive failed: {e}")
-                yield externalscaler_pb2.IsActiveResponse(result=True)
+                logger.error(f"IsActive failed: {e}")
+                fallbacks_total.labels(method="IsActive").inc()
+                return externalscaler_pb2.IsActiveResponse(result=True)
+    
+    def StreamIsActive(self, request, context):
+        while True:
+            with rpc_latency.labels(method="StreamIsActive").time():
+                try:
+                    data = self.fetch_forecast()
+                    
+                    if data is not None:
+                        predicted_values = data.get('predicted_values') or [data.get('current_value', 0)]
+                        max_predicted = max(predicted_values)
+                        is_active = max_predicted > TARGET_VALUE
+                        
+                        logger.info(f"StreamIsActive: max_predicted={max_predicted}, active={is_active}")
+                        
+                        response = externalscaler_pb2.IsActiveResponse(result=is_active)
+                    else:
+                        fallbacks_total.labels(method="StreamIsActive").inc()
+                        response = externalscaler_pb2.IsActiveResponse(result=True)
+                        
+                except Exception as e:
+                    logger.error(f"StreamIsActive failed: {e}")
+                    fallbacks_total.labels(method="StreamIsActive").inc()
+                    response = externalscaler_pb2.IsActiveResponse(result=True)
             
-            asyncio.sleep(10)  # Check every 10 seconds
+            yield response
+            time.sleep(10)  # Check every 10 seconds
     
     def GetMetricSpec(self, request, context):
-        spec = externalscaler_pb2.GetMetricSpecResponse()
-        spec.metric_specs.append(
-            externalscaler_pb2.MetricSpec(
-                metric_name="predicted_load",
-                target_size=int(TARGET_VALUE)
-            )
-        )
-        return spec
-    
-    def GetMetrics(self, request, context):
-        try:
-            response = requests.post(
-                f"{FORECASTER_URL}/forecast",
-                json={
-                    "metric_name": METRIC_NAME,
-                    "horizon_minutes": FORECAST_MINUTES
-                },
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Use current actual value instead of predictions for now
-                current_value = data.get('current_value', 0)
-                max_predicted = current_value
-                
-                # Calculate desired replicas based on predicted load
-                desired_replicas = max(
-                    MIN_REPLICAS,
-                    min(MAX_REPLICAS, int(max_predicted / TARGET_VALUE) + 1)
-                )
-                
-                # Report metric value that will result in desired replicas
-                # HPA calculates: desired_replicas = metric_value / target_value
-                # So: metric_value = desired_replicas * target_value
-                metric_value = desired_replicas * TARGET_VALUE
-                
-                logger.info(
-                    f"GetMetrics: predicted={max_predicted}, "
-                    f"metric_value={metric_value}, desired_replicas={desired_replicas}"
-                )
-                
-                return externalscaler_pb2.GetMetricsResponse(
-                    metrics=[
-                        externalscaler_pb2.MetricValue(
-                            metric_name="predicted_load",
-                            metric_value=int(metric_value)
-                        )
-                    ]
+        with rpc_latency.labels(method="GetMetricSpec").time():
+            spec = externalscaler_pb2.GetMetricSpecResponse()
+            spec.metric_specs.append(
+                externalscaler_pb2.MetricSpec(
+                    metric_name="predicted_load",
+                    target_size=int(TARGET_VALUE)
                 )
-            else:
-                logger.error(f"Forecaster returned status {response.status_code}")
-                # Return current target to maintain current scale
-                return externalscaler_pb2.GetMetricsResponse(
-                    metrics=[
-                        externalscaler_pb2.MetricValue(
-                            metric_name="predicted_load",
-                            metric_value=int(TARGET_VALUE)
-                        )
-                    ]
-                )
-                
-        except Exception as e:
-            logger.error(f"GetMetrics failed: {e}")
-            # Return safe default
-            return externalscaler_pb2.GetMetricsResponse(
-                metrics=[
-                    externalscaler_pb2.MetricValue(
-                        metric_name="predicted_load",
-                        metric_value=int(TARGET_VALUE)
-                    )
-                ]
             )
+            return spec
     
-    def StreamGetMetrics(self, request, context) -> Iterator[externalscaler_pb2.GetMetricsResponse]:
-        while True:
+    def GetMetrics(self, request, context):
+        with rpc_latency.labels(method="GetMetrics").time():
             try:
-                response = requests.post(
-                    f"{FORECASTER_URL}/forecast",
-                    json={
-                        "metric_name": METRIC_NAME,
-                        "horizon_minutes": FORECAST_MINUTES
-                    },
-                    timeout=5
-                )
+                data = self.fetch_forecast(current_only=True)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    predicted_values = data.get('predicted_values', [0])
-                    max_predicted = max(predicted_values) if predicted_values else 0
+                if data is not None:
+                    # Use current actual value instead of predictions for now
+                    current_value = data.get('current_value', 0)
+                    max_predicted = current_value
+                    predicted_load_gauge.set(max_predicted)
                     
-                    metric_value = max_predicted
+                    # Calculate desired replicas based on predicted load
+                    desired_replicas = desired_replicas_for(max_predicted)
                     
-                    logger.info(f"StreamGetMetrics: metric_value={metric_value}")
+                    # Report metric value that will result in desired replicas
+                    # HPA calculates: desired_replicas = metric_value / target_value
+                    # So: metric_value = desired_replicas * target_value
+                    metric_value = desired_replicas * TARGET_VALUE
                     
-                    yield externalscaler_pb2.GetMetricsResponse(
-                        metrics=[
-                            externalscaler_pb2.MetricValue(
-                                metric_name="predicted_load",
-                                metric_value=int(metric_value)
-                            )
-                        ]
+                    logger.info(
+                        f"GetMetrics: predicted={max_predicted}, "
+                        f"metric_value={metric_value}, desired_replicas={desired_replicas}"
                     )
+                    
+                    return self.report("GetMetrics", metric_value)
                 else:
-                    yield externalscaler_pb2.GetMetricsResponse(
-                        metrics=[
-                            externalscaler_pb2.MetricValue(
-                                metric_name="predicted_load",
-                                metric_value=int(TARGET_VALUE)
-                            )
-                        ]
-                    )
+                    return self.hold("GetMetrics")
                     
             except Exception as e:
-                logger.error(f"StreamGetMetrics failed: {e}")
-                yield externalscaler_pb2.GetMetricsResponse(
-                    metrics=[
-                        externalscaler_pb2.MetricValue(
-                            metric_name="predicted_load",
-                            metric_value=int(TARGET_VALUE)
-                        )
-                    ]
-                )
+                logger.error(f"GetMetrics failed: {e}")
+                return self.hold("GetMetrics")
+    
+    def StreamGetMetrics(self, request, context) -> Iterator[externalscaler_pb2.GetMetricsResponse]:
+        while True:
+            with rpc_latency.labels(method="StreamGetMetrics").time():
+                try:
+                    data = self.fetch_forecast()
+                    
+                    if data is not None:
+                        predicted_values = data.get('predicted_values', [0])
+                        max_predicted = max(predicted_values) if predicted_values else 0
+                        predicted_load_gauge.set(max_predicted)
+                        
+                        metric_value = max_predicted
+                        
+                        logger.info(f"StreamGetMetrics: metric_value={metric_value}")
+                        
+                        response = self.report("StreamGetMetrics", metric_value)
+                    else:
+                        response = self.hold("StreamGetMetrics")
+                        
+                except Exception as e:
+                    logger.error(f"StreamGetMetrics failed: {e}")
+                    response = self.hold("StreamGetMetrics")
             
-            asyncio.sleep(30)  # Update every 30 seconds
+            yield response
+            time.sleep(30)  # Update every 30 seconds
 
 
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    externalscaler_pb2_grpc.add_ExternalScalerServicer_to_server(
-        ExternalScaler(), server
-    )
+    scaler = ExternalScaler()
+    scaler.forecaster_client.start_prober()
+    externalscaler_pb2_grpc.add_ExternalScalerServicer_to_server(scaler, server)
+    
+    start_http_server(METRICS_PORT)
+    logger.info(f"Metrics endpoint listening on port {METRICS_PORT}")
     
     port = os.getenv("GRPC_PORT", "6000")
     server.add_insecure_port(f"[::]:{port}")
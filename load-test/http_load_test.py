@@ -10,12 +10,20 @@ import json
 import time
 from datetime import datetime
 
+from results import PROMETHEUS_URL, PhaseRecorder, ReplicaSampler, build_results, write_results
+
 
 class HTTPLoadTester:
     def __init__(self, host: str, port: int):
         self.base_url = f"http://{host}:{port}"
         self.session = None
         self.message_count = 0
+        self.phase = "baseline"
+        self.phases = PhaseRecorder()
+        
+    def set_phase(self, phase: str):
+        self.phase = phase
+        self.phases.enter(phase)
         
     async def __aenter__(self):
         self.session = aiohttp.ClientSession()
@@ -27,20 +35,26 @@ class HTTPLoadTester:
     
     async def send_message(self, sender_id: str, message: str):
         """Send a single HTTP message"""
+        phase = self.phase
+        start = time.perf_counter()
         try:
             async with self.session.post(
                 f"{self.base_url}/api/message",
                 json={"sender": sender_id, "message": message},
                 timeout=aiohttp.ClientTimeout(total=10)
             ) as response:
+                await response.read()
                 if response.status == 200:
                     self.message_count += 1
+                    self.phases.record(time.perf_counter() - start, phase=phase)
                     return True
                 else:
                     print(f"Error: HTTP {response.status}")
+                    self.phases.record(None, str(response.status), phase)
                     return False
         except Exception as e:
             print(f"Request failed: {e}")
+            self.phases.record(None, type(e).__name__, phase)
             return False
     
     async def get_stats(self):
@@ -75,10 +89,16 @@ class HTTPLoadTester:
         print(f"Worker {worker_id} completed: sent {self.message_count} messages")
 
 
-async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
+async def run_load_test(host: str, port: int, pattern: str, duration: int = 60,
+                        results_path: str = None, prometheus_url: str = PROMETHEUS_URL):
     """Run different load test patterns"""
     
     async with HTTPLoadTester(host, port) as tester:
+        sampler = ReplicaSampler(prometheus_url, phase=lambda: tester.phase)
+        if results_path:
+            sampler.start()
+        started_at = time.time()
+        
         print(f"Starting HTTP load test: {pattern} pattern for {duration}s")
         print(f"Target: {host}:{port}")
         
@@ -91,9 +111,11 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
             # Sudden spike: 0 -> 20 msg/sec -> 0
             print("\n=== SPIKE PATTERN ===")
             print("Phase 1: Baseline (5s)")
+            tester.set_phase("baseline")
             await asyncio.sleep(5)
             
             print("Phase 2: Spike to 20 msg/sec (30s)")
+            tester.set_phase("spike")
             workers = []
             for i in range(4):  # 4 workers, 5 msg/sec each = 20 total
                 workers.append(asyncio.create_task(
@@ -102,6 +124,7 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
             await asyncio.gather(*workers)
             
             print("Phase 3: Cool down (25s)")
+            tester.set_phase("cooldown")
             await asyncio.sleep(25)
             
         elif pattern == "gradual":
@@ -117,6 +140,7 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
             print("\n=== GRADUAL PATTERN ===")
             for i, (rate, duration_phase) in enumerate(phases):
                 print(f"Phase {i+1}: {rate} msg/sec for {duration_phase}s")
+                tester.set_phase(f"step{i+1}")
                 
                 # Calculate workers needed
                 workers_needed = min(rate, 10)  # Max 10 workers
@@ -130,11 +154,13 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
                 await asyncio.gather(*workers)
                 
                 # Brief pause between phases
+                tester.set_phase("pause")
                 await asyncio.sleep(2)
         
         elif pattern == "sustained":
             # Sustained high load
             print(f"\n=== SUSTAINED PATTERN: 12 msg/sec for {duration}s ===")
+            tester.set_phase("sustained")
             workers = []
             for i in range(6):  # 6 workers, 2 msg/sec each = 12 total
                 workers.append(asyncio.create_task(
@@ -142,6 +168,7 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
                 ))
             await asyncio.gather(*workers)
         
+        tester.phases.close()
         # Get final stats
         await asyncio.sleep(2)
         final_stats = await tester.get_stats()
@@ -150,6 +177,13 @@ async def run_load_test(host: str, port: int, pattern: str, duration: int = 60):
             if initial_stats:
                 messages_sent = final_stats['total_messages'] - initial_stats['total_messages']
                 print(f"Messages sent during test: {messages_sent}")
+        
+        if results_path:
+            config = {"host": host, "port": port, "pattern": pattern, "duration": duration}
+            write_results(results_path, build_results(
+                "http_load_test", config, started_at, time.time(), tester.phases.report(),
+                sampler.stop(), backend_stats={"initial": initial_stats, "final": final_stats},
+            ))
 
 
 async def main():
@@ -160,6 +194,9 @@ async def main():
                        default="spike", help="Load test pattern")
     parser.add_argument("--duration", type=int, default=60, 
                        help="Test duration in seconds (for sustained pattern)")
+    parser.add_argument("--results", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--prometheus-url", default=PROMETHEUS_URL,
+                       help="Prometheus to sample the replica timeline from")
     
     args = parser.parse_args()
     
@@ -167,7 +204,8 @@ async def main():
     print("=" * 50)
     
     try:
-        await run_load_test(args.host, args.port, args.pattern, args.duration)
+        await run_load_test(args.host, args.port, args.pattern, args.duration,
+                            args.results, args.prometheus_url)
         print("\n✅ Load test completed!")
     except KeyboardInterrupt:
         print("\n⏹️  Load test interrupted by user")
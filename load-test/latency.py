@@ -0,0 +1,178 @@
+"""
+Latency histograms and end-to-end broadcast delivery tracking for the load tests.
+
+Senders stamp each chat message with its load phase, a per-sender sequence
+number and the send time. Receivers parse the broadcasts they get, record
+send-to-delivery latency per phase and count gaps in each sender's sequence
+as lost messages. Send and receive times come from ``time.time()``, so
+senders and receivers must share a clock (run them on the same machine).
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+
+from hdrh.histogram import HdrHistogram
+
+# Latencies are recorded in microseconds, from 1us to 60s with 3 significant digits
+LOWEST_US = 1
+HIGHEST_US = 60_000_000
+SIGNIFICANT_DIGITS = 3
+PERCENTILES = (50, 90, 99, 99.9)
+
+MARKER = "lt1|"
+
+
+def new_histogram() -> HdrHistogram:
+    return HdrHistogram(LOWEST_US, HIGHEST_US, SIGNIFICANT_DIGITS)
+
+
+def record_seconds(histogram: HdrHistogram, seconds: float):
+    histogram.record_value(min(max(int(seconds * 1e6), LOWEST_US), HIGHEST_US))
+
+
+def summarize(histogram: HdrHistogram) -> Dict[str, float]:
+    """Percentiles of a histogram in milliseconds"""
+    summary = {"count": histogram.get_total_count()}
+    if summary["count"]:
+        for percentile in PERCENTILES:
+            summary[f"p{percentile:g}_ms"] = histogram.get_value_at_percentile(percentile) / 1000
+        summary["mean_ms"] = histogram.get_mean_value() / 1000
+        summary["max_ms"] = histogram.get_max_value() / 1000
+    return summary
+
+
+def stamp(phase: str, seq: int, text: str = "") -> str:
+    """Message text carrying what a receiver needs to measure delivery"""
+    return f"{MARKER}{phase}|{seq}|{time.time():.6f}|{text}"
+
+
+def parse_stamp(message: str) -> Optional[Tuple[str, int, float]]:
+    if not isinstance(message, str) or not message.startswith(MARKER):
+        return None
+    try:
+        phase, seq, sent, _ = message[len(MARKER):].split("|", 3)
+        return phase, int(seq), float(sent)
+    except ValueError:
+        return None
+
+
+def broadcast_messages(frame) -> Iterable[dict]:
+    """Chat messages in a received frame; batch frames carry several.
+
+    Replay frames are skipped: they resend history, not live deliveries.
+    """
+    if isinstance(frame, (str, bytes)):
+        try:
+            frame = json.loads(frame)
+        except ValueError:
+            return []
+    if not isinstance(frame, dict):
+        return []
+    if frame.get("type") == "batch":
+        return frame.get("messages", [])
+    if frame.get("type") == "broadcast":
+        return [frame]
+    return []
+
+
+@dataclass
+class PhaseDelivery:
+    sent: int = 0
+    delivered: int = 0
+    lost: int = 0
+    latency: HdrHistogram = field(default_factory=new_histogram)
+
+    def summary(self) -> Dict:
+        observed = self.delivered + self.lost
+        return {
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "lost": self.lost,
+            "loss_rate": self.lost / observed if observed else 0.0,
+            "latency": summarize(self.latency),
+        }
+
+
+class DeliveryTracker:
+    """Per-phase delivery latency and loss across every receiver in a process"""
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseDelivery] = {}
+        # (receiver, sender) -> highest sequence number seen
+        self._last_seq: Dict[Tuple[str, str], int] = {}
+
+    def phase(self, name: str) -> PhaseDelivery:
+        if name not in self.phases:
+            self.phases[name] = PhaseDelivery()
+        return self.phases[name]
+
+    def record_sent(self, phase: str):
+        self.phase(phase).sent += 1
+
+    def observe(self, receiver_id: str, frame, received_at: Optional[float] = None):
+        """Record every stamped broadcast in a frame received by ``receiver_id``"""
+        received_at = received_at or time.time()
+        for message in broadcast_messages(frame):
+            stamped = parse_stamp(message.get("message"))
+            if stamped is None:
+                continue
+            phase_name, seq, sent_at = stamped
+            phase = self.phase(phase_name)
+
+            key = (receiver_id, message.get("sender"))
+            last = self._last_seq.get(key)
+            if last is not None and seq <= last:
+                continue  # Duplicate, e.g. resent after a reconnect
+            if last is not None:
+                phase.lost += seq - last - 1
+            self._last_seq[key] = seq
+
+            phase.delivered += 1
+            record_seconds(phase.latency, received_at - sent_at)
+
+    def forget_receiver(self, receiver_id: str):
+        """Drop a receiver's sequence state once it disconnects"""
+        self._last_seq = {
+            key: seq for key, seq in self._last_seq.items() if key[0] != receiver_id
+        }
+
+    def encode(self) -> Dict[str, Dict]:
+        """Picklable per-phase state, for merging across processes"""
+        return {
+            name: {"sent": p.sent, "delivered": p.delivered, "lost": p.lost,
+                   "latency": p.latency.encode()}
+            for name, p in self.phases.items()
+        }
+
+    def drain(self) -> Dict[str, Dict]:
+        """encode() the counts so far and start them over.
+
+        Sequence state is kept, so a gap spanning two drains still counts as loss.
+        """
+        encoded = self.encode()
+        self.phases = {}
+        return encoded
+
+    def merge(self, encoded: Dict[str, Dict]):
+        for name, state in encoded.items():
+            phase = self.phase(name)
+            phase.sent += state["sent"]
+            phase.delivered += state["delivered"]
+            phase.lost += state["lost"]
+            phase.latency.decode_and_add(state["latency"])
+
+    def report(self) -> Dict[str, Dict]:
+        return {name: phase.summary() for name, phase in self.phases.items()}
+
+
+def print_delivery_report(report: Dict[str, Dict]):
+    print("\nBroadcast delivery by phase (send -> receive on other clients)")
+    print(f"{'phase':<14} {'sent':>8} {'delivered':>10} {'lost':>7} {'loss %':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, phase in report.items():
+        latency = phase["latency"]
+        print(f"{name:<14} {phase['sent']:>8} {phase['delivered']:>10} {phase['lost']:>7} "
+              f"{phase['loss_rate'] * 100:>6.2f}% {latency.get('p50_ms', 0):>8.1f} "
+              f"{latency.get('p99_ms', 0):>8.1f} {latency.get('max_ms', 0):>8.1f}")
@@ -9,6 +9,9 @@ import aiohttp
 import websockets
 from websockets.exceptions import WebSocketException
 
+from latency import DeliveryTracker, print_delivery_report, stamp
+from results import PROMETHEUS_URL, PhaseRecorder, ReplicaSampler, build_results, write_results
+
 class LoadTester:
     def __init__(self, base_url: str, ws_url: str):
         self.base_url = base_url
@@ -16,19 +19,45 @@ class LoadTester:
         self.active_connections = []
         self.message_count = 0
         self.start_time = time.time()
+        self.phase = "base"  # Messages are attributed to the phase they were sent in
+        self.delivery = DeliveryTracker()
+        self.phases = PhaseRecorder()
+        self.phases.enter(self.phase)
+        
+    def set_phase(self, phase: str):
+        print(f"Phase: {phase}")
+        self.phase = phase
+        self.phases.enter(phase)
+        
+    async def receive(self, client_id: str, websocket):
+        """Record delivery of other clients' broadcasts"""
+        try:
+            async for frame in websocket:
+                self.delivery.observe(client_id, frame)
+        except WebSocketException:
+            pass
         
     async def create_client(self, client_id: str):
+        websocket = None
+        receiver = None
         try:
             websocket = await websockets.connect(f"{self.ws_url}/ws/{client_id}")
             self.active_connections.append(websocket)
+            receiver = asyncio.create_task(self.receive(client_id, websocket))
             
             # Send messages periodically
+            seq = 0
             while True:
+                seq += 1
                 message = {
                     "type": "message",
-                    "message": f"Test message from {client_id} at {datetime.now().isoformat()}"
+                    "message": stamp(self.phase, seq, f"Test message from {client_id} at {datetime.now().isoformat()}")
                 }
+                phase = self.phase
+                sent_at = time.perf_counter()
                 await websocket.send(json.dumps(message))
+                self.phases.record(time.perf_counter() - sent_at, phase=phase)
+                self.delivery.record_sent(phase)
                 self.message_count += 1
                 
                 # Random delay between messages
@@ -36,13 +65,25 @@ class LoadTester:
                 
         except WebSocketException as e:
             print(f"Client {client_id} disconnected: {e}")
+            self.phases.record(None, type(e).__name__)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"Error in client {client_id}: {e}")
+            self.phases.record(None, type(e).__name__)
+        finally:
+            if receiver:
+                receiver.cancel()
+            if websocket:
+                self.active_connections.remove(websocket)
+                await websocket.close()
+            self.delivery.forget_receiver(client_id)
     
     async def simulate_spike_pattern(self, base_clients: int = 10, spike_clients: int = 50):
         tasks = []
         
         # Start with base load
+        self.set_phase("base")
         print(f"Starting base load with {base_clients} clients...")
         for i in range(base_clients):
             task = asyncio.create_task(self.create_client(f"base_client_{i}"))
@@ -53,6 +94,7 @@ class LoadTester:
         await asyncio.sleep(30)
         
         # Create traffic spike
+        self.set_phase("spike")
         print(f"Creating traffic spike with {spike_clients} additional clients...")
         for i in range(spike_clients):
             task = asyncio.create_task(self.create_client(f"spike_client_{i}"))
@@ -63,12 +105,14 @@ class LoadTester:
         await asyncio.sleep(60)
         
         # Gradual decrease
+        self.set_phase("ramp_down")
         print("Gradually decreasing load...")
         for task in tasks[base_clients:]:
             task.cancel()
             await asyncio.sleep(0.2)
         
         # Maintain base load
+        self.set_phase("cooldown")
         await asyncio.sleep(30)
         
         # Cancel remaining tasks
@@ -87,15 +131,22 @@ class LoadTester:
             # Calculate target clients based on time of day pattern
             base_clients = 5
             if 6 <= hour_equivalent < 9:  # Morning spike
+                phase = "morning"
                 target_clients = base_clients + int(20 * (hour_equivalent - 6) / 3)
             elif 9 <= hour_equivalent < 17:  # Daytime steady
+                phase = "daytime"
                 target_clients = base_clients + 20
             elif 17 <= hour_equivalent < 20:  # Evening spike
+                phase = "evening"
                 target_clients = base_clients + 30
             elif 20 <= hour_equivalent < 22:  # Evening decline
+                phase = "decline"
                 target_clients = base_clients + int(20 * (22 - hour_equivalent) / 2)
             else:  # Night time low
+                phase = "night"
                 target_clients = base_clients
+            if phase != self.phase:
+                self.set_phase(phase)
             
             current_clients = len([t for t in tasks if not t.done()])
             
@@ -126,6 +177,7 @@ class LoadTester:
         start_time = time.time()
         
         # Start base load
+        self.set_phase("base")
         for i in range(base_clients):
             task = asyncio.create_task(self.create_client(f"base_{i}"))
             tasks.append(task)
@@ -135,6 +187,7 @@ class LoadTester:
             # Random chance of spike
             if random.random() < 0.1:  # 10% chance every check
                 spike_size = random.randint(10, 30)
+                self.set_phase("spike")
                 print(f"Random spike: Adding {spike_size} clients")
                 
                 spike_tasks = []
@@ -152,6 +205,7 @@ class LoadTester:
                     if not task.done():
                         task.cancel()
                 print(f"Spike ended")
+                self.set_phase("base")
             
             await asyncio.sleep(10)
         
@@ -164,6 +218,14 @@ class LoadTester:
         elapsed = time.time() - self.start_time
         rate = self.message_count / elapsed if elapsed > 0 else 0
         print(f"\nStats: Total messages: {self.message_count}, Rate: {rate:.2f} msg/s")
+        print_delivery_report(self.delivery.report())
+
+    def write_results(self, path: str, config: dict, replicas: list):
+        self.phases.close()
+        write_results(path, build_results(
+            "load_test", config, self.start_time, time.time(), self.phases.report(),
+            replicas, self.delivery.report(),
+        ))
 
 
 async def main():
@@ -180,6 +242,9 @@ async def main():
                        help="Number of spike clients")
     parser.add_argument("--duration", type=float, default=10,
                        help="Duration in minutes")
+    parser.add_argument("--results", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--prometheus-url", default=PROMETHEUS_URL,
+                       help="Prometheus to sample the replica timeline from")
     
     args = parser.parse_args()
     
@@ -187,6 +252,9 @@ async def main():
     ws_url = f"ws://{args.host}:{args.port}"
     
     tester = LoadTester(base_url, ws_url)
+    sampler = ReplicaSampler(args.prometheus_url, phase=lambda: tester.phase)
+    if args.results:
+        sampler.start()
     
     try:
         if args.pattern == "spike":
@@ -199,6 +267,8 @@ async def main():
         print("\nTest interrupted")
     finally:
         tester.print_stats()
+        if args.results:
+            tester.write_results(args.results, vars(args), sampler.stop())
 
 
 if __name__ == "__main__":
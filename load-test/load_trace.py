@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Capture production traffic as a compact load trace, for replay by open_loop.py.
+
+A trace is a CSV of ``time,messages_per_second,connections`` rows, one per
+Prometheus step, with time in seconds from the start of the capture. The
+first two columns are also what ``simulator/simulate.py --trace`` reads, so
+the same file drives both the offline simulator and a real load test.
+
+    python load-test/load_trace.py capture --since 24h --output traces/last-day.csv
+    python load-test/load_trace.py show traces/last-day.csv --compression 60
+    python load-test/open_loop.py --mode websocket --trace traces/last-day.csv --compression 60
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import re
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from typing import List, Tuple
+
+PROMETHEUS_URL = "http://localhost:9090"
+RATE_QUERY = "sum(chat_messages_per_second)"
+CONNECTIONS_QUERY = "sum(chat_active_connections)"
+MAX_POINTS = 10000  # Prometheus refuses range queries above 11000 points per series
+
+
+class Trace:
+    """Piecewise-constant message rate and connection count over trace seconds"""
+
+    def __init__(self, times: List[float], rates: List[float], connections: List[float]):
+        if not times:
+            raise ValueError("Trace is empty")
+        self.times = times
+        self.rates = rates
+        self.connections = connections
+        # The last sample holds for one more step
+        step = times[-1] - times[-2] if len(times) > 1 else 1.0
+        self.duration = times[-1] + step
+
+    def _index(self, t: float) -> int:
+        return max(0, bisect.bisect_right(self.times, t) - 1)
+
+    def rate_at(self, t: float) -> float:
+        return self.rates[self._index(t)]
+
+    def connections_at(self, t: float) -> float:
+        return self.connections[self._index(t)]
+
+    def mean_rate(self) -> float:
+        return sum(self.rates) / len(self.rates)
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        times, rates, connections = [], [], []
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                try:
+                    t, rate = float(row[0]), float(row[1])
+                except (IndexError, ValueError):
+                    continue  # header or malformed row
+                times.append(t)
+                rates.append(max(0.0, rate))
+                connections.append(max(0.0, float(row[2])) if len(row) > 2 and row[2] else 0.0)
+        return cls(times, rates, connections)
+
+    def save(self, path: str, comment: str = ""):
+        with open(path, "w", newline="") as f:
+            if comment:
+                f.write(f"# {comment}\n")
+            writer = csv.writer(f)
+            writer.writerow(["time", "messages_per_second", "connections"])
+            for t, rate, conns in zip(self.times, self.rates, self.connections):
+                writer.writerow([f"{t:g}", f"{rate:.2f}", f"{conns:.0f}"])
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in a Prometheus-style duration such as 90m, 24h or 7d"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", text)
+    if not match:
+        raise ValueError(f"Invalid duration {text!r}, expected e.g. 90m, 24h or 7d")
+    return float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+
+
+def query_range(prometheus_url: str, query: str, start: float, end: float,
+                step: float) -> List[Tuple[float, float]]:
+    """Samples of a single-series query, fetched in chunks below Prometheus' point limit"""
+    samples: List[Tuple[float, float]] = []
+    chunk = step * MAX_POINTS
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + chunk)
+        params = urllib.parse.urlencode(
+            {"query": query, "start": chunk_start, "end": chunk_end, "step": step}
+        )
+        with urllib.request.urlopen(f"{prometheus_url}/api/v1/query_range?{params}",
+                                    timeout=30) as response:
+            data = json.load(response)
+        if data.get("status") != "success":
+            raise RuntimeError(f"Prometheus query failed: {data.get('error', data)}")
+        for series in data["data"]["result"][:1]:
+            samples.extend((float(t), float(v)) for t, v in series["values"])
+        chunk_start = chunk_end + step
+    return samples
+
+
+def capture(prometheus_url: str, start: float, end: float, step: float,
+            rate_query: str = RATE_QUERY, connections_query: str = CONNECTIONS_QUERY) -> Trace:
+    rates = {round(t, 3): v for t, v in query_range(prometheus_url, rate_query, start, end, step)}
+    connections = {
+        round(t, 3): v for t, v in query_range(prometheus_url, connections_query, start, end, step)
+    }
+    if not rates:
+        raise RuntimeError(f"No samples for {rate_query} between {start} and {end}")
+
+    # Gaps (scrape failures, restarts) keep the previous value
+    first = min(rates)
+    times, rate_values, connection_values = [], [], []
+    last_rate = last_connections = 0.0
+    for i in range(int(round((max(rates) - first) / step)) + 1):
+        t = round(first + i * step, 3)
+        last_rate = rates.get(t, last_rate)
+        last_connections = connections.get(t, last_connections)
+        times.append(i * step)
+        rate_values.append(last_rate)
+        connection_values.append(last_connections)
+    return Trace(times, rate_values, connection_values)
+
+
+def print_summary(trace: Trace, compression: float):
+    print(f"Duration:          {trace.duration / 3600:.2f}h ({len(trace.times)} samples)")
+    print(f"Messages/s:        mean {trace.mean_rate():.1f}, peak {max(trace.rates):.1f}")
+    print(f"Connections:       peak {max(trace.connections):.0f}")
+    print(f"Replay at {compression:g}x:    {trace.duration / compression / 60:.1f} minutes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture and inspect load traces")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = subparsers.add_parser("capture", help="Export a trace from Prometheus")
+    capture_parser.add_argument("--prometheus-url", default=PROMETHEUS_URL)
+    capture_parser.add_argument("--since", default="24h",
+                                help="How far back to capture, e.g. 90m, 24h, 7d")
+    capture_parser.add_argument("--start", help="ISO-8601 start time (overrides --since)")
+    capture_parser.add_argument("--end", help="ISO-8601 end time (default: now)")
+    capture_parser.add_argument("--step", type=float, default=15.0, help="Seconds between samples")
+    capture_parser.add_argument("--rate-query", default=RATE_QUERY)
+    capture_parser.add_argument("--connections-query", default=CONNECTIONS_QUERY)
+    capture_parser.add_argument("--output", required=True, help="Trace CSV to write")
+
+    show_parser = subparsers.add_parser("show", help="Summarize a trace")
+    show_parser.add_argument("trace")
+    show_parser.add_argument("--compression", type=float, default=60.0)
+
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        end = datetime.fromisoformat(args.end).timestamp() if args.end else time.time()
+        start = (
+            datetime.fromisoformat(args.start).timestamp() if args.start
+            else end - parse_duration(args.since)
+        )
+        trace = capture(args.prometheus_url, start, end, args.step,
+                        args.rate_query, args.connections_query)
+        trace.save(args.output, comment=(
+            f"captured from {args.prometheus_url} "
+            f"{datetime.fromtimestamp(start).isoformat()} to "
+            f"{datetime.fromtimestamp(end).isoformat()} step={args.step:g}s"
+        ))
+        print(f"Wrote {args.output}")
+        print_summary(trace, 60.0)
+    else:
+        print_summary(Trace.load(args.trace), args.compression)
+
+
+if __name__ == "__main__":
+    main()
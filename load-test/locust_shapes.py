@@ -0,0 +1,137 @@
+"""
+Locust load shapes for the scaling scenarios of load_test.py and http_load_test.py.
+
+Each shape sets the user count over time and names the current phase, which
+locustfile.py stamps into messages so delivery is reported per phase. Shapes
+only run on the master in distributed mode; it sends the phase to the workers.
+
+Sizes and timings come from the environment, like the services' settings:
+
+- LOCUST_BASE_USERS / LOCUST_PEAK_USERS: quietest and busiest user counts
+- LOCUST_SPAWN_RATE: users started or stopped per second
+- LOCUST_TIME_SCALE: stretches every shape, e.g. 10 to give the autoscaler time
+- LOCUST_DAY_SECONDS: length of the compressed day of the daily shape
+- LOCUST_TRACE, LOCUST_COMPRESSION, LOCUST_CONNECTION_SCALE: the trace shape
+  follows a load_trace.py CSV's connection count
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+from locust import LoadTestShape
+
+from load_trace import Trace
+
+BASE_USERS = int(os.getenv("LOCUST_BASE_USERS", "10"))
+PEAK_USERS = int(os.getenv("LOCUST_PEAK_USERS", "60"))
+SPAWN_RATE = float(os.getenv("LOCUST_SPAWN_RATE", "10"))
+TIME_SCALE = float(os.getenv("LOCUST_TIME_SCALE", "1"))
+DAY_SECONDS = float(os.getenv("LOCUST_DAY_SECONDS", "1800"))
+TRACE_PATH = os.getenv("LOCUST_TRACE", "")
+COMPRESSION = float(os.getenv("LOCUST_COMPRESSION", "60"))
+CONNECTION_SCALE = float(os.getenv("LOCUST_CONNECTION_SCALE", "1"))
+
+
+class PhasedShape(LoadTestShape):
+    """A shape that also names the phase of the test it is in"""
+
+    abstract = True
+    phase = "locust"
+
+    def target(self, run_time: float) -> Optional[Tuple[str, int, float]]:
+        """(phase, users, spawn rate) at ``run_time``, or None to stop"""
+        raise NotImplementedError
+
+    def tick(self):
+        target = self.target(self.get_run_time())
+        if target is None:
+            return None
+        phase, users, spawn_rate = target
+        self.phase = phase
+        if self.runner is not None:
+            # Every tick, so workers that join mid-test pick it up too
+            self.runner.send_message("phase", phase)
+        return max(users, 0), spawn_rate
+
+
+class StagedShape(PhasedShape):
+    """Fixed stages of (phase, seconds, users, spawn rate), stretched by TIME_SCALE"""
+
+    abstract = True
+    stages: List[Tuple[str, float, int, float]] = []
+
+    def target(self, run_time: float):
+        elapsed = 0.0
+        for phase, seconds, users, spawn_rate in self.stages:
+            elapsed += seconds * TIME_SCALE
+            if run_time < elapsed:
+                return phase, users, spawn_rate
+        return None
+
+
+class SpikeShape(StagedShape):
+    """load_test.py's spike: base load, a sudden spike, a gradual ramp down, cooldown"""
+
+    stages = [
+        ("base", 30, BASE_USERS, SPAWN_RATE),
+        ("spike", 60, PEAK_USERS, SPAWN_RATE * 2),
+        ("ramp_down", 30, BASE_USERS, max((PEAK_USERS - BASE_USERS) / 30, 1)),
+        ("cooldown", 30, BASE_USERS, SPAWN_RATE),
+    ]
+
+
+class GradualShape(StagedShape):
+    """http_load_test.py's gradual steps (2, 5, 10, 15, 5 msg/s) as fractions of the peak"""
+
+    stages = [
+        (f"step{i + 1}", seconds, max(round(PEAK_USERS * rate / 15), 1), SPAWN_RATE)
+        for i, (rate, seconds) in enumerate([(2, 10), (5, 10), (10, 15), (15, 15), (5, 10)])
+    ]
+
+
+class DailyShape(PhasedShape):
+    """load_test.py's daily pattern: a day compressed into DAY_SECONDS"""
+
+    def target(self, run_time: float):
+        duration = DAY_SECONDS * TIME_SCALE
+        if run_time >= duration:
+            return None
+        hour = run_time / duration * 24
+        extra = PEAK_USERS - BASE_USERS
+        if 6 <= hour < 9:  # Morning ramp
+            phase, users = "morning", BASE_USERS + extra * 2 / 3 * (hour - 6) / 3
+        elif 9 <= hour < 17:  # Daytime steady
+            phase, users = "daytime", BASE_USERS + extra * 2 / 3
+        elif 17 <= hour < 20:  # Evening peak
+            phase, users = "evening", PEAK_USERS
+        elif 20 <= hour < 22:  # Evening decline
+            phase, users = "decline", BASE_USERS + extra * 2 / 3 * (22 - hour) / 2
+        else:  # Night time low
+            phase, users = "night", BASE_USERS
+        return phase, int(users), SPAWN_RATE
+
+
+class TraceShape(PhasedShape):
+    """Users follow a captured trace's connection count, COMPRESSION times faster"""
+
+    def __init__(self):
+        super().__init__()
+        if not TRACE_PATH:
+            raise ValueError("LOCUST_TRACE must name a trace CSV for the trace shape")
+        self.trace = Trace.load(TRACE_PATH)
+
+    def target(self, run_time: float):
+        trace_t = run_time * COMPRESSION
+        if trace_t >= self.trace.duration:
+            return None
+        hour = int(min(trace_t, self.trace.times[-1]) // 3600)
+        users = round(self.trace.connections_at(trace_t) * CONNECTION_SCALE)
+        return f"t+{hour:02d}:00", users, SPAWN_RATE
+
+
+SHAPES = {
+    "spike": SpikeShape,
+    "gradual": GradualShape,
+    "daily": DailyShape,
+    "trace": TraceShape,
+}
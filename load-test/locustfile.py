@@ -1,108 +1,208 @@
+"""
+Locust load test for the chat backend.
+
+- ChatUser: a WebSocket client. Tasks only send; a reader greenlet per user
+  receives broadcasts and reports delivery latency, so no task blocks on recv.
+- HttpChatUser: posts messages to /api/message. The backend doesn't broadcast
+  these, so they don't count towards delivery.
+
+Set LOCUST_SHAPE to spike, gradual, daily or trace to drive the user count
+from locust_shapes.py; without it, users are set from the UI or --users.
+Messages are stamped with the shape's phase, which the master sends to the
+workers in distributed mode, and the workers' delivery loss counts are
+merged on the master.
+"""
+
 import json
+import os
 import random
 import time
-from locust import HttpUser, TaskSet, between, events, task
-from websocket import create_connection, WebSocketTimeoutException
 
+import gevent
+from locust import between, events, task
+from locust.contrib.fasthttp import FastHttpUser
+from locust.runners import MasterRunner, WorkerRunner
+from websocket import WebSocketConnectionClosedException, create_connection
+
+from latency import DeliveryTracker, broadcast_messages, parse_stamp, print_delivery_report, stamp
+from locust_shapes import SHAPES
+
+SHAPE = os.getenv("LOCUST_SHAPE", "")
+ROOMS = int(os.getenv("LOCUST_ROOMS", "0"))  # 0: everyone in the default room
+
+if SHAPE:
+    ChatShape = SHAPES[SHAPE]
+
+phase = "locust"
+delivery = DeliveryTracker()
+
+
+def pick_room():
+    return f"locust-{random.randrange(ROOMS)}" if ROOMS else None
+
+
+def fire(name: str, started: float, length: int = 0, exception: Exception = None):
+    events.request.fire(
+        request_type="WebSocket",
+        name=name,
+        response_time=(time.time() - started) * 1000,
+        response_length=length,
+        exception=exception,
+        context={}
+    )
+
+
+@events.init.add_listener
+def on_init(environment, **kwargs):
+    runner = environment.runner
+    if runner is None or isinstance(runner, MasterRunner):
+        return
+
+    def on_phase(environment, msg, **kwargs):
+        global phase
+        phase = msg.data
 
-class ChatUser(HttpUser):
+    runner.register_message("phase", on_phase)
+
+
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data):
+    """Send the delivery counts since the last report"""
+    data["delivery"] = delivery.drain()
+
+
+@events.worker_report.add_listener
+def on_worker_report(client_id, data):
+    delivery.merge(data.get("delivery", {}))
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    if not isinstance(environment.runner, WorkerRunner) and delivery.phases:
+        print_delivery_report(delivery.report())
+
+
+class ChatUser(FastHttpUser):
     wait_time = between(1, 3)
     ws = None
+    reader = None
     user_id = None
-    
+    room = None
+    seq = 0
+
     def on_start(self):
         self.user_id = f"user_{time.time()}_{random.randint(1000, 9999)}"
+        self.room = pick_room()
         self.connect_websocket()
-    
+
     def on_stop(self):
-        if self.ws:
-            self.ws.close()
-    
+        self.disconnect_websocket()
+        delivery.forget_receiver(self.user_id)
+
     def connect_websocket(self):
+        start_time = time.time()
         try:
             ws_url = self.host.replace("http://", "ws://").replace("https://", "wss://")
-            self.ws = create_connection(f"{ws_url}/ws/{self.user_id}", timeout=5)
-            
-            events.request.fire(
-                request_type="WebSocket",
-                name="connect",
-                response_time=0,
-                response_length=0,
-                exception=None,
-                context={}
-            )
+            query = f"?room={self.room}" if self.room else ""
+            # Locust monkey-patches sockets, so this blocks only this user's greenlet
+            self.ws = create_connection(f"{ws_url}/ws/{self.user_id}{query}", timeout=5)
+            self.ws.settimeout(None)
+            self.reader = gevent.spawn(self.receive_broadcasts, self.ws)
+            fire("connect", start_time)
         except Exception as e:
-            events.request.fire(
-                request_type="WebSocket",
-                name="connect",
-                response_time=0,
-                response_length=0,
-                exception=e,
-                context={}
-            )
-    
+            self.ws = None
+            fire("connect", start_time, exception=e)
+
+    def disconnect_websocket(self):
+        if self.reader:
+            self.reader.kill(block=False)
+            self.reader = None
+        if self.ws:
+            self.ws.close()
+            self.ws = None
+
     @task(3)
     def send_message(self):
         if not self.ws:
             self.connect_websocket()
             return
-        
+
         start_time = time.time()
         try:
+            self.seq += 1
             message = {
                 "type": "message",
-                "message": f"Hello from {self.user_id} at {time.time()}"
+                "message": stamp(phase, self.seq, f"Hello from {self.user_id}")
             }
-            self.ws.send(json.dumps(message))
-            
-            # Try to receive response
-            self.ws.settimeout(1)
-            try:
-                response = self.ws.recv()
-                response_time = (time.time() - start_time) * 1000
-                
-                events.request.fire(
-                    request_type="WebSocket",
-                    name="send_message",
-                    response_time=response_time,
-                    response_length=len(response),
-                    exception=None,
-                    context={}
-                )
-            except WebSocketTimeoutException:
-                # No response expected for broadcasts
-                response_time = (time.time() - start_time) * 1000
-                events.request.fire(
-                    request_type="WebSocket",
-                    name="send_message",
-                    response_time=response_time,
-                    response_length=0,
-                    exception=None,
-                    context={}
-                )
+            payload = json.dumps(message)
+            self.ws.send(payload)
+            delivery.record_sent(phase)
+
+            # The sender gets no reply, so this only times the send itself
+            fire("send_message", start_time, len(payload))
         except Exception as e:
-            response_time = (time.time() - start_time) * 1000
-            events.request.fire(
-                request_type="WebSocket",
-                name="send_message",
-                response_time=response_time,
-                response_length=0,
-                exception=e,
-                context={}
-            )
-            # Reconnect on error
-            self.ws = None
-    
+            fire("send_message", start_time, exception=e)
+            # Reconnect on the next send
+            self.disconnect_websocket()
+
+    def receive_broadcasts(self, ws):
+        """Report other users' messages as they arrive, timed from when they were sent"""
+        try:
+            while True:
+                frame = ws.recv()
+                received_at = time.time()
+                try:
+                    message = json.loads(frame)
+                except ValueError:
+                    continue
+                for item in broadcast_messages(message):
+                    stamped = parse_stamp(item.get("message"))
+                    if stamped is None:
+                        continue
+                    stamped_phase, _, sent_at = stamped
+                    events.request.fire(
+                        request_type="WebSocket",
+                        name=f"broadcast_delivery [{stamped_phase}]",
+                        response_time=(received_at - sent_at) * 1000,
+                        response_length=len(frame),
+                        exception=None,
+                        context={}
+                    )
+                delivery.observe(self.user_id, message, received_at)
+        except (WebSocketConnectionClosedException, OSError):
+            if self.ws is ws:
+                self.ws = None
+
     @task(1)
     def check_stats(self):
-        try:
-            response = self.client.get("/stats")
-            if response.status_code == 200:
-                stats = response.json()
-                print(f"Current stats: {stats}")
-        except Exception as e:
-            print(f"Failed to get stats: {e}")
-    
+        self.client.get("/stats")
+
+    @task(1)
+    def check_health(self):
+        self.client.get("/health")
+
+
+class HttpChatUser(FastHttpUser):
+    """Posts messages over HTTP, the path the backend load-balances across pods"""
+
+    wait_time = between(1, 3)
+    seq = 0
+
+    def on_start(self):
+        self.user_id = f"http_{time.time()}_{random.randint(1000, 9999)}"
+        self.room = pick_room()
+
+    @task(5)
+    def send_message(self):
+        self.seq += 1
+        body = {"sender": self.user_id, "message": stamp(phase, self.seq, "Hello over HTTP")}
+        if self.room:
+            body["room"] = self.room
+        with self.client.post("/api/message", json=body, name="/api/message",
+                              catch_response=True) as response:
+            if response.status_code == 429:
+                response.failure("Rate limited by admission control")
+
     @task(1)
     def check_health(self):
         self.client.get("/health")
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Open-loop, multi-process load generator for the chat backend.
+
+Requests are scheduled at a fixed arrival rate that does not depend on how
+fast the backend answers, and latency is measured from each request's
+intended start time rather than from when it was actually sent. A closed-loop
+worker that waits for a response before sending the next request stops
+generating load exactly when the backend slows down, hiding the slowdown
+from its own latency numbers (coordinated omission); this generator does not.
+
+Load is split across worker processes, each with its own event loop, and
+their HDR latency histograms are merged into one report. In WebSocket mode
+every message is stamped, so the receiving clients also report end-to-end
+broadcast delivery latency and loss.
+
+With ``--trace`` the arrival rate (and, for WebSockets, the number of open
+connections) follows a trace captured by load_trace.py, replayed
+``--compression`` times faster than it was recorded.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import random
+import resource
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+import websockets
+
+from latency import (
+    DeliveryTracker, new_histogram, print_delivery_report, record_seconds, stamp, summarize
+)
+from load_trace import Trace
+from results import PROMETHEUS_URL, PhaseRecorder, ReplicaSampler, build_results, write_results
+
+PHASE = "steady"
+SUCCESS_OUTCOMES = ("200", "sent")  # Everything else is counted as an error, without latency
+
+
+@dataclass
+class LoadConfig:
+    mode: str = "http"  # "http" or "websocket"
+    host: str = "localhost"
+    port: int = 8000
+    rate: float = 100.0  # Arrivals per second across all processes
+    duration: float = 60.0  # seconds
+    processes: int = 1
+    connections: int = 100  # WebSocket connections across all processes
+    room_size: int = 50  # WebSocket connections per room
+    senders: int = 1000  # Distinct HTTP sender ids, so per-sender limits see realistic traffic
+    connect_rate: float = 500.0  # New WebSocket connections per second per process
+    arrival: str = "uniform"  # "uniform" or "poisson" inter-arrival times
+    max_in_flight: int = 10000  # Per process; arrivals beyond this are counted as skipped
+    timeout: float = 10.0  # seconds
+    trace: Optional[str] = None  # Trace CSV; replaces rate, duration and connections
+    compression: float = 60.0  # Trace seconds replayed per real second
+    rate_scale: float = 1.0  # Multiplier on the trace's message rate
+    connection_scale: float = 1.0  # Multiplier on the trace's connection count
+    phase_seconds: float = 3600.0  # Trace seconds per reported phase
+
+
+def arrival_times(start: float, rate: Callable[[float], float], duration: float, arrival: str,
+                  offset: float = 0.0, rng: Optional[random.Random] = None) -> Iterator[float]:
+    """Intended send times, fixed in advance by the arrival process alone.
+
+    ``rate`` gives arrivals per second at a number of seconds into the run.
+    """
+    rng = rng or random.Random()
+    end = start + duration
+    intended = start + offset
+    while intended < end:
+        current = rate(intended - start)
+        if current <= 0:
+            intended += 0.1  # Idle stretch of a trace
+            continue
+        yield intended
+        intended += rng.expovariate(current) if arrival == "poisson" else 1.0 / current
+
+
+class OpenLoopWorker:
+    """One process's share of the load, driven by its own event loop"""
+
+    def __init__(self, config: LoadConfig, index: int):
+        self.config = config
+        self.index = index
+        self.trace = Trace.load(config.trace) if config.trace else None
+        self.duration = (
+            self.trace.duration / config.compression if self.trace else config.duration
+        )
+        self.latency = new_histogram()
+        self.connect_latency = new_histogram()
+        self.outcomes: Counter = Counter()
+        self.received = 0
+        self.in_flight = 0
+        self.connections: List[Tuple[str, object]] = []  # (client id, socket)
+        self.sequences: Dict[str, int] = {}
+        self.next_client = 0
+        self.delivery = DeliveryTracker()
+        self.phases = PhaseRecorder()
+        self._readers = set()
+        self.rng = random.Random(index)
+
+    async def run(self, barrier) -> Dict:
+        loop = asyncio.get_running_loop()
+        if self.config.mode == "websocket":
+            raise_fd_limit()
+            await self.open_connections(self.target_connections(0))
+            print(f"[worker {self.index}] {len(self.connections)} connections open")
+            send = self.websocket_send
+        else:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0),
+                timeout=aiohttp.ClientTimeout(total=self.config.timeout),
+            )
+            send = lambda seq, phase: self.http_send(session, seq)  # noqa: E731
+
+        # Start every process's schedule together, after all connections are up
+        await loop.run_in_executor(None, barrier.wait)
+        started = loop.time()
+        await self.drive(loop, started, send)
+        elapsed = loop.time() - started
+
+        if self.config.mode == "websocket":
+            # Let the last broadcasts arrive before counting them
+            await asyncio.sleep(1)
+            await asyncio.gather(
+                *(ws.close() for _, ws in self.connections), return_exceptions=True
+            )
+        else:
+            await session.close()
+        return self.result(elapsed)
+
+    def offered_rate(self, elapsed: float) -> float:
+        """This process's arrivals per second at ``elapsed`` seconds into the run"""
+        if self.trace:
+            rate = self.trace.rate_at(elapsed * self.config.compression) * self.config.rate_scale
+        else:
+            rate = self.config.rate
+        return rate / self.config.processes
+
+    def target_connections(self, elapsed: float) -> int:
+        if self.trace:
+            connections = (
+                self.trace.connections_at(elapsed * self.config.compression)
+                * self.config.connection_scale
+            )
+        else:
+            connections = self.config.connections
+        return int(round(connections / self.config.processes))
+
+    def phase_at(self, elapsed: float) -> str:
+        """Phase label: trace time bucketed by ``phase_seconds``, e.g. t+13:00"""
+        if not self.trace:
+            return PHASE
+        trace_seconds = min(elapsed * self.config.compression, self.trace.times[-1])
+        bucket = int(trace_seconds // self.config.phase_seconds * self.config.phase_seconds)
+        return f"t+{bucket // 3600:02d}:{bucket % 3600 // 60:02d}"
+
+    async def drive(self, loop, start: float, send: Callable[[int, str], object]):
+        """Fire each arrival at its intended time without waiting for earlier ones"""
+        # Stagger processes so their uniform schedules interleave instead of colliding
+        initial_rate = self.offered_rate(0)
+        offset = self.index / self.config.processes / initial_rate if initial_rate > 0 else 0.0
+        follower = None
+        if self.trace and self.config.mode == "websocket":
+            follower = asyncio.create_task(self.follow_connections(loop, start))
+
+        tasks = set()
+        for seq, intended in enumerate(
+            arrival_times(start, self.offered_rate, self.duration, self.config.arrival,
+                          offset, self.rng)
+        ):
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            phase = self.phase_at(intended - start)
+            if phase != self.phases.current:
+                self.phases.enter(phase, at=intended)
+            if self.in_flight >= self.config.max_in_flight:
+                self.outcomes["skipped"] += 1
+                self.phases.record(None, "skipped", phase)
+                continue
+            task = asyncio.create_task(self.timed(send, seq, phase, intended, loop))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        self.phases.close(at=start + self.duration)
+        if follower:
+            follower.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.config.timeout)
+
+    async def follow_connections(self, loop, start: float):
+        """Open or close sockets every second to track the trace's connection count"""
+        while True:
+            await asyncio.sleep(1)
+            difference = self.target_connections(loop.time() - start) - len(self.connections)
+            if difference > 0:
+                await self.open_connections(min(difference, int(self.config.connect_rate)))
+            elif difference < 0:
+                await self.close_connections(-difference)
+
+    async def timed(self, send, seq: int, phase: str, intended: float, loop):
+        self.in_flight += 1
+        try:
+            outcome = await asyncio.wait_for(send(seq, phase), timeout=self.config.timeout)
+            # Measured from the intended start, so time spent queued behind a slow backend counts
+            latency = loop.time() - intended
+        except asyncio.TimeoutError:
+            outcome, latency = "timeout", None
+        except Exception as e:
+            outcome, latency = type(e).__name__, None
+        finally:
+            self.in_flight -= 1
+        self.outcomes[outcome] += 1
+        if outcome in SUCCESS_OUTCOMES:
+            record_seconds(self.latency, latency)
+            self.phases.record(latency, None, phase)
+        else:
+            # e.g. an HTTP error status or no open socket: not a completed request
+            self.phases.record(None, outcome, phase)
+
+    async def http_send(self, session: aiohttp.ClientSession, seq: int) -> str:
+        sender = f"ol-{self.index}-{seq % max(1, self.config.senders // self.config.processes)}"
+        async with session.post(
+            f"http://{self.config.host}:{self.config.port}/api/message",
+            json={"sender": sender, "message": f"open-loop message {seq}"},
+        ) as response:
+            await response.read()
+            return str(response.status)
+
+    async def websocket_send(self, seq: int, phase: str) -> str:
+        if not self.connections:
+            return "no_connection"
+        client_id, ws = self.connections[seq % len(self.connections)]
+        client_seq = self.sequences[client_id] = self.sequences.get(client_id, 0) + 1
+        self.delivery.record_sent(phase)
+        await ws.send(json.dumps({"type": "message", "message": stamp(phase, client_seq)}))
+        return "sent"
+
+    async def open_connections(self, count: int):
+        """Open ``count`` more sockets at ``connect_rate``, filling rooms of ``room_size``"""
+        interval = 1.0 / self.config.connect_rate
+        pending = []
+        for _ in range(count):
+            pending.append(asyncio.create_task(self.connect(self.next_client)))
+            self.next_client += 1
+            await asyncio.sleep(interval)
+        await asyncio.gather(*pending)
+
+    async def close_connections(self, count: int):
+        closing = self.connections[-count:]
+        del self.connections[-count:]
+        await asyncio.gather(*(ws.close() for _, ws in closing), return_exceptions=True)
+        for client_id, _ in closing:
+            self.delivery.forget_receiver(client_id)
+
+    async def connect(self, n: int):
+        room = f"load-{self.index}-{n // self.config.room_size}"
+        client_id = f"ol-{self.index}-{n}"
+        url = f"ws://{self.config.host}:{self.config.port}/ws/{client_id}?room={room}"
+        start = time.perf_counter()
+        try:
+            ws = await websockets.connect(url, ping_interval=None, open_timeout=self.config.timeout)
+        except Exception as e:
+            self.outcomes[f"connect_{type(e).__name__}"] += 1
+            return
+        record_seconds(self.connect_latency, time.perf_counter() - start)
+        self.connections.append((client_id, ws))
+        reader = asyncio.create_task(self.read(client_id, ws))
+        self._readers.add(reader)
+        reader.add_done_callback(self._readers.discard)
+
+    async def read(self, client_id: str, ws):
+        """Drain broadcasts, so the backend never sees this client as a slow
+        consumer, and record when each stamped one arrived"""
+        try:
+            async for frame in ws:
+                self.received += 1
+                self.delivery.observe(client_id, frame)
+        except websockets.ConnectionClosed:
+            pass
+
+    def result(self, elapsed: float) -> Dict:
+        return {
+            "elapsed": elapsed,
+            "outcomes": dict(self.outcomes),
+            "received": self.received,
+            "latency": self.latency.encode(),
+            "connect_latency": self.connect_latency.encode(),
+            "delivery": self.delivery.encode(),
+            "phases": self.phases.encode(),
+        }
+
+
+def raise_fd_limit():
+    """Tens of thousands of sockets need more than the usual 1024 file descriptors"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def worker_main(config: Dict, index: int, barrier, results):
+    worker = OpenLoopWorker(LoadConfig(**config), index)
+    try:
+        results.put(asyncio.run(worker.run(barrier)))
+    except Exception as e:
+        barrier.abort()  # Release the other processes instead of leaving them waiting
+        results.put({"error": f"worker {index}: {e!r}"})
+
+
+def run(config: LoadConfig) -> Dict:
+    """Run the load across ``config.processes`` processes and merge their results"""
+    barrier = mp.Barrier(config.processes)
+    results = mp.Queue()
+    processes = [
+        mp.Process(target=worker_main, args=(asdict(config), index, barrier, results))
+        for index in range(config.processes)
+    ]
+    for process in processes:
+        process.start()
+    worker_results = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [result["error"] for result in worker_results if "error" in result]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+    latency, connect_latency = new_histogram(), new_histogram()
+    outcomes: Counter = Counter()
+    delivery = DeliveryTracker()
+    phases = PhaseRecorder()
+    for result in worker_results:
+        latency.decode_and_add(result["latency"])
+        connect_latency.decode_and_add(result["connect_latency"])
+        outcomes.update(result["outcomes"])
+        delivery.merge(result["delivery"])
+        phases.merge(result["phases"])
+
+    elapsed = max(result["elapsed"] for result in worker_results)
+    completed = latency.get_total_count()
+    return {
+        "config": asdict(config),
+        "elapsed": elapsed,
+        "target_rate": (
+            Trace.load(config.trace).mean_rate() * config.rate_scale if config.trace else config.rate
+        ),
+        "achieved_rate": completed / elapsed if elapsed else 0.0,
+        "outcomes": dict(outcomes),
+        "received": sum(result["received"] for result in worker_results),
+        "latency": summarize(latency),
+        "connect_latency": summarize(connect_latency),
+        "delivery": delivery.report(),
+        "phases": phases.report(),
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    if config["trace"]:
+        print(f"\n=== Open-loop {config['mode']} replay of {config['trace']} at "
+              f"{config['compression']:g}x across {config['processes']} processes ===")
+    else:
+        print(f"\n=== Open-loop {config['mode']} load: {config['rate']:g}/s for "
+              f"{config['duration']:g}s across {config['processes']} processes ===")
+    print(f"Achieved rate: {report['achieved_rate']:.1f}/s")
+    print(f"Outcomes: {report['outcomes']}")
+    if config["mode"] == "websocket":
+        print(f"Broadcast frames received: {report['received']}")
+    for name in ("latency", "connect_latency"):
+        summary = report[name]
+        if not summary["count"]:
+            continue
+        print(f"\n{name} ({summary['count']} samples)")
+        for key, value in summary.items():
+            if key != "count":
+                print(f"  {key:>10}: {value:10.2f}")
+    if report["delivery"]:
+        print_delivery_report(report["delivery"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop multi-process load generator")
+    parser.add_argument("--mode", choices=["http", "websocket"], default="http")
+    parser.add_argument("--host", default="localhost", help="Backend host")
+    parser.add_argument("--port", type=int, default=8000, help="Backend port")
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="Messages per second across all processes")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--processes", type=int, default=mp.cpu_count(),
+                        help="Worker processes, each with its own event loop")
+    parser.add_argument("--connections", type=int, default=100,
+                        help="WebSocket connections across all processes")
+    parser.add_argument("--room-size", type=int, default=50,
+                        help="WebSocket connections per room")
+    parser.add_argument("--senders", type=int, default=1000, help="Distinct HTTP sender ids")
+    parser.add_argument("--connect-rate", type=float, default=500.0,
+                        help="New WebSocket connections per second per process")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="uniform",
+                        help="Inter-arrival time distribution")
+    parser.add_argument("--max-in-flight", type=int, default=10000,
+                        help="Outstanding requests per process before arrivals are skipped")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Request timeout in seconds")
+    parser.add_argument("--trace", help="Replay a trace CSV from load_trace.py instead of a fixed rate")
+    parser.add_argument("--compression", type=float, default=60.0,
+                        help="Trace seconds replayed per real second")
+    parser.add_argument("--rate-scale", type=float, default=1.0,
+                        help="Multiplier on the trace's message rate")
+    parser.add_argument("--connection-scale", type=float, default=1.0,
+                        help="Multiplier on the trace's connection count")
+    parser.add_argument("--phase-seconds", type=float, default=3600.0,
+                        help="Trace seconds per reported phase")
+    parser.add_argument("--results", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--prometheus-url", default=PROMETHEUS_URL,
+                        help="Prometheus to sample the replica timeline from")
+
+    args = parser.parse_args()
+    results_path = args.__dict__.pop("results")
+    prometheus_url = args.__dict__.pop("prometheus_url")
+    config = LoadConfig(**vars(args))
+
+    sampler = ReplicaSampler(prometheus_url)
+    if results_path:
+        sampler.start()
+    started_at = time.time()
+    report = run(config)
+    print_report(report)
+    if results_path:
+        write_results(results_path, build_results(
+            "open_loop", asdict(config), started_at, time.time(), report["phases"],
+            sampler.stop(), report["delivery"],
+        ))
+
+
+if __name__ == "__main__":
+    main()
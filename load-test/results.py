@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Machine-readable load-test results and regression checks against a baseline.
+
+Load testers run with ``--results PATH`` write one JSON document per run:
+
+    {
+      "tool": "open_loop", "started_at": "...", "finished_at": "...",
+      "config": {...},                      # the tester's arguments
+      "phases": {
+        "spike": {
+          "seconds": 60.0, "completed": 2990, "throughput_per_second": 49.8,
+          "errors": {"timeout": 3}, "error_rate": 0.001,
+          "latency": {"count": 2990, "p50_ms": ..., "p99_ms": ..., "histogram": "<HDR>"},
+          "delivery": {...}                 # WebSocket testers only, see latency.py
+        }
+      },
+      "replicas": [{"t": 0.0, "phase": "base", "replicas": 2, "desired": 3}, ...]
+    }
+
+``histogram`` is the base64 HDR encoding, so runs can be re-analysed or
+merged later. The replica timeline is sampled from Prometheus
+(kube-state-metrics and the scaler's own gauge) while the test runs.
+
+    python load-test/results.py compare baseline.json results.json --max-p99-increase 0.25
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from hdrh.histogram import HdrHistogram
+
+from latency import new_histogram, record_seconds, summarize
+
+PROMETHEUS_URL = "http://localhost:9090"
+REPLICAS_QUERY = 'sum(kube_deployment_status_replicas{deployment="chat-backend"})'
+DESIRED_REPLICAS_QUERY = "max(scaler_desired_replicas)"
+
+
+@dataclass
+class PhaseResult:
+    seconds: float = 0.0
+    completed: int = 0
+    errors: Counter = field(default_factory=Counter)
+    latency: HdrHistogram = field(default_factory=new_histogram)
+
+    def summary(self) -> Dict:
+        failed = sum(self.errors.values())
+        attempted = self.completed + failed
+        latency = summarize(self.latency)
+        latency["histogram"] = self.latency.encode().decode()
+        return {
+            "seconds": self.seconds,
+            "completed": self.completed,
+            "throughput_per_second": self.completed / self.seconds if self.seconds else 0.0,
+            "errors": dict(self.errors),
+            "error_rate": failed / attempted if attempted else 0.0,
+            "latency": latency,
+        }
+
+
+class PhaseRecorder:
+    """Per-phase send throughput, latency and errors for one load tester.
+
+    ``enter`` starts a phase and ends the previous one; a phase entered more
+    than once (e.g. "base" between random spikes) accumulates its time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.phases: Dict[str, PhaseResult] = {}
+        self.current: Optional[str] = None
+        self._entered_at = 0.0
+
+    def phase(self, name: str) -> PhaseResult:
+        if name not in self.phases:
+            self.phases[name] = PhaseResult()
+        return self.phases[name]
+
+    def enter(self, name: str, at: Optional[float] = None):
+        at = self.clock() if at is None else at
+        self.close(at)
+        self.phase(name)
+        self.current = name
+        self._entered_at = at
+
+    def close(self, at: Optional[float] = None):
+        if self.current is not None:
+            at = self.clock() if at is None else at
+            self.phases[self.current].seconds += max(0.0, at - self._entered_at)
+            self.current = None
+
+    def record(self, seconds: Optional[float], error: Optional[str] = None,
+               phase: Optional[str] = None):
+        """One send: its latency if it succeeded, otherwise the kind of error"""
+        result = self.phase(phase or self.current or "run")
+        if error:
+            result.errors[error] += 1
+        else:
+            result.completed += 1
+            record_seconds(result.latency, seconds)
+
+    def encode(self) -> Dict[str, Dict]:
+        """Picklable per-phase state, for merging across processes"""
+        return {
+            name: {"seconds": p.seconds, "completed": p.completed, "errors": dict(p.errors),
+                   "latency": p.latency.encode()}
+            for name, p in self.phases.items()
+        }
+
+    def merge(self, encoded: Dict[str, Dict]):
+        """Add another process's phases; processes run side by side, so times don't add up"""
+        for name, state in encoded.items():
+            phase = self.phase(name)
+            phase.seconds = max(phase.seconds, state["seconds"])
+            phase.completed += state["completed"]
+            phase.errors.update(state["errors"])
+            phase.latency.decode_and_add(state["latency"])
+
+    def report(self) -> Dict[str, Dict]:
+        return {name: phase.summary() for name, phase in self.phases.items()}
+
+
+def query(prometheus_url: str, promql: str) -> Optional[float]:
+    """Value of a single-series instant query, or None when it has no result"""
+    params = urllib.parse.urlencode({"query": promql})
+    with urllib.request.urlopen(f"{prometheus_url}/api/v1/query?{params}", timeout=5) as response:
+        data = json.load(response)
+    result = data.get("data", {}).get("result", [])
+    return float(result[0]["value"][1]) if result else None
+
+
+class ReplicaSampler:
+    """Samples the backend's actual and desired replica counts in a background thread"""
+
+    def __init__(self, prometheus_url: str = PROMETHEUS_URL, interval: float = 5.0,
+                 phase: Callable[[], Optional[str]] = lambda: None,
+                 replicas_query: str = REPLICAS_QUERY,
+                 desired_query: str = DESIRED_REPLICAS_QUERY):
+        self.prometheus_url = prometheus_url
+        self.interval = interval
+        self.phase = phase
+        self.replicas_query = replicas_query
+        self.desired_query = desired_query
+        self.samples: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> List[Dict]:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        warned = False
+        while not self._stop.is_set():
+            try:
+                self.samples.append({
+                    "t": round(time.monotonic() - self._started, 3),
+                    "phase": self.phase(),
+                    "replicas": query(self.prometheus_url, self.replicas_query),
+                    "desired": query(self.prometheus_url, self.desired_query),
+                })
+            except Exception as e:
+                if not warned:
+                    print(f"Replica sampling from {self.prometheus_url} failed: {e}")
+                    warned = True
+            self._stop.wait(self.interval)
+
+
+def build_results(tool: str, config: Dict, started_at: float, finished_at: float,
+                  phases: Dict[str, Dict], replicas: List[Dict],
+                  delivery: Optional[Dict[str, Dict]] = None, **extra) -> Dict:
+    """One run's results document; ``started_at``/``finished_at`` are Unix times"""
+    phases = {name: dict(phase) for name, phase in phases.items()}
+    for name, report in (delivery or {}).items():
+        phases.setdefault(name, {})["delivery"] = report
+    return {
+        "tool": tool,
+        "started_at": datetime.fromtimestamp(started_at).isoformat(),
+        "finished_at": datetime.fromtimestamp(finished_at).isoformat(),
+        "duration_seconds": finished_at - started_at,
+        "config": config,
+        "phases": phases,
+        "replicas": replicas,
+        **extra,
+    }
+
+
+def write_results(path: str, results: Dict):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def compare(baseline: Dict, current: Dict, max_throughput_drop: float = 0.1,
+            max_p50_increase: float = 0.25, max_p99_increase: float = 0.25,
+            max_error_rate_increase: float = 0.01, max_loss_rate_increase: float = 0.001,
+            min_samples: int = 100) -> List[str]:
+    """Regressions of ``current`` against ``baseline``, phase by phase.
+
+    Throughput and latency thresholds are relative (0.1 = 10%); error and
+    loss rate thresholds are absolute. Latency is only compared for phases
+    with at least ``min_samples`` samples in both runs.
+    """
+    regressions = []
+
+    def check_latency(phase: str, what: str, base: Dict, cur: Dict):
+        if min(base.get("count", 0), cur.get("count", 0)) < min_samples:
+            return
+        for key, limit in (("p50_ms", max_p50_increase), ("p99_ms", max_p99_increase)):
+            if base.get(key) and cur[key] > base[key] * (1 + limit):
+                regressions.append(
+                    f"{phase}: {what} {key} {base[key]:.1f} -> {cur[key]:.1f} "
+                    f"(+{(cur[key] / base[key] - 1) * 100:.0f}%, limit +{limit * 100:.0f}%)"
+                )
+
+    for name, base in baseline["phases"].items():
+        cur = current["phases"].get(name)
+        if cur is None:
+            regressions.append(f"{name}: phase missing from current run")
+            continue
+
+        base_rate = base.get("throughput_per_second", 0.0)
+        cur_rate = cur.get("throughput_per_second", 0.0)
+        if base_rate and cur_rate < base_rate * (1 - max_throughput_drop):
+            regressions.append(
+                f"{name}: throughput {base_rate:.1f}/s -> {cur_rate:.1f}/s "
+                f"(-{(1 - cur_rate / base_rate) * 100:.0f}%, limit -{max_throughput_drop * 100:.0f}%)"
+            )
+        if cur.get("error_rate", 0.0) > base.get("error_rate", 0.0) + max_error_rate_increase:
+            regressions.append(
+                f"{name}: error rate {base.get('error_rate', 0.0):.2%} -> {cur['error_rate']:.2%}"
+            )
+        if "latency" in base and "latency" in cur:
+            check_latency(name, "send latency", base["latency"], cur["latency"])
+
+        if "delivery" in base and "delivery" in cur:
+            base_delivery, cur_delivery = base["delivery"], cur["delivery"]
+            if cur_delivery["loss_rate"] > base_delivery["loss_rate"] + max_loss_rate_increase:
+                regressions.append(
+                    f"{name}: delivery loss {base_delivery['loss_rate']:.2%} -> "
+                    f"{cur_delivery['loss_rate']:.2%}"
+                )
+            check_latency(name, "delivery latency", base_delivery["latency"],
+                          cur_delivery["latency"])
+    return regressions
+
+
+def print_comparison(baseline: Dict, current: Dict):
+    print("Each column: baseline, then current")
+    print(f"{'phase':<14} {'throughput/s':>24} {'p50 ms':>20} {'p99 ms':>20} {'errors':>16}")
+    for name, base in baseline["phases"].items():
+        cur = current["phases"].get(name, {})
+        base_latency, cur_latency = base.get("latency", {}), cur.get("latency", {})
+        print(f"{name:<14} "
+              f"{base.get('throughput_per_second', 0):>11.1f} {cur.get('throughput_per_second', 0):>12.1f} "
+              f"{base_latency.get('p50_ms', 0):>9.1f} {cur_latency.get('p50_ms', 0):>10.1f} "
+              f"{base_latency.get('p99_ms', 0):>9.1f} {cur_latency.get('p99_ms', 0):>10.1f} "
+              f"{base.get('error_rate', 0):>7.2%} {cur.get('error_rate', 0):>8.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compare load-test results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Fail when a run regressed against a baseline"
+    )
+    compare_parser.add_argument("baseline", help="Results file of the baseline run")
+    compare_parser.add_argument("current", help="Results file of the run to check")
+    compare_parser.add_argument("--max-throughput-drop", type=float, default=0.1,
+                                help="Allowed relative throughput drop per phase")
+    compare_parser.add_argument("--max-p50-increase", type=float, default=0.25,
+                                help="Allowed relative p50 latency increase")
+    compare_parser.add_argument("--max-p99-increase", type=float, default=0.25,
+                                help="Allowed relative p99 latency increase")
+    compare_parser.add_argument("--max-error-rate-increase", type=float, default=0.01,
+                                help="Allowed absolute error rate increase")
+    compare_parser.add_argument("--max-loss-rate-increase", type=float, default=0.001,
+                                help="Allowed absolute broadcast loss rate increase")
+    compare_parser.add_argument("--min-samples", type=int, default=100,
+                                help="Latency samples a phase needs before it is compared")
+
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    print_comparison(baseline, current)
+    regressions = compare(
+        baseline, current, args.max_throughput_drop, args.max_p50_increase,
+        args.max_p99_increase, args.max_error_rate_increase, args.max_loss_rate_increase,
+        args.min_samples,
+    )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+A fake Prometheus for offline runs of the forecaster and scaler.
+
+Serves ``/api/v1/query`` and ``/api/v1/query_range`` from in-memory series,
+which are filled from a load trace, by scraping ``/metrics`` endpoints, or
+directly with ``add_sample``. Only the PromQL the services send is understood:
+
+    name                   name{label="value"}     name[24h]
+    sum(name)              max(name{...})          (also min, avg, count)
+
+Anything else is answered with a ``bad_data`` error, like Prometheus does for
+a query it can't parse.
+
+    python offline-stack/fake_prometheus.py --trace traces/day.csv --compression 60 --port 9090
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client.parser import text_string_to_metric_families
+
+LOOKBACK_SECONDS = 300  # Prometheus' default lookback delta for instant vectors
+TRACE_METRICS = ("chat_messages_per_second", "chat_active_connections")
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+QUERY = re.compile(
+    r"^\s*(?:(?P<aggregation>sum|max|min|avg|count)\s*\(\s*)?"
+    r"(?P<name>[A-Za-z_:][\w:]*)\s*"
+    r"(?:\{(?P<matchers>[^}]*)\})?\s*"
+    r"(?:\[(?P<range>\d+(?:\.\d+)?[smhd])\])?\s*"
+    r"(?P<close>\))?\s*$"
+)
+MATCHER = re.compile(r'\s*(\w+)\s*=\s*"([^"]*)"\s*(?:,|$)')
+AGGREGATIONS = {
+    "sum": sum,
+    "max": max,
+    "min": min,
+    "avg": lambda values: sum(values) / len(values),
+    "count": len,
+}
+
+
+class BadQuery(ValueError):
+    pass
+
+
+def parse_duration(text: str) -> float:
+    return float(text[:-1]) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[text[-1]]
+
+
+class Series:
+    def __init__(self):
+        self.times: List[float] = []
+        self.values: List[float] = []
+
+    def add(self, t: float, value: float):
+        if self.times and t < self.times[-1]:
+            index = bisect.bisect_right(self.times, t)
+            self.times.insert(index, t)
+            self.values.insert(index, value)
+        else:
+            self.times.append(t)
+            self.values.append(value)
+
+    def at(self, t: float) -> Optional[float]:
+        """Latest value at or before ``t`` within the lookback window"""
+        index = bisect.bisect_right(self.times, t) - 1
+        if index < 0 or t - self.times[index] > LOOKBACK_SECONDS:
+            return None
+        return self.values[index]
+
+    def between(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Samples in ``(start, end]``"""
+        first = bisect.bisect_right(self.times, start)
+        last = bisect.bisect_right(self.times, end)
+        return list(zip(self.times[first:last], self.values[first:last]))
+
+
+class FakePrometheus:
+    def __init__(self):
+        self.series: Dict[SeriesKey, Series] = {}
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def add_sample(self, name: str, value: float, t: Optional[float] = None,
+                   labels: Optional[Dict[str, str]] = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.series.setdefault(key, Series()).add(time.time() if t is None else t, value)
+
+    def load_trace(self, path: str, compression: float = 1.0, position: float = 0.0,
+                   start: Optional[float] = None):
+        """Serve a trace CSV's columns as TRACE_METRICS, replayed ``compression`` times
+        faster from ``start``; the first ``position`` trace seconds are already history"""
+        columns: Dict[str, Tuple[List[float], List[float]]] = {
+            name: ([], []) for name in TRACE_METRICS
+        }
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                try:
+                    trace_t = float(row[0])
+                    values = [float(value) for value in row[1:len(TRACE_METRICS) + 1] if value]
+                except ValueError:
+                    continue  # header or malformed row
+                for name, value in zip(TRACE_METRICS, values):
+                    columns[name][0].append(trace_t)
+                    columns[name][1].append(value)
+        for name, (times, values) in columns.items():
+            self.replay(name, times, values, compression, position, start)
+
+    def replay(self, name: str, times: List[float], values: List[float],
+               compression: float = 1.0, position: float = 0.0, start: Optional[float] = None):
+        """Serve ``values`` at trace ``times`` as ``name``, mapped to wall time as in load_trace"""
+        start = time.time() if start is None else start
+        for trace_t, value in zip(times, values):
+            self.add_sample(name, value, start + (trace_t - position) / compression)
+
+    def scrape(self, url: str):
+        """Add every sample exposed by a /metrics endpoint"""
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+        now = time.time()
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                self.add_sample(sample.name, sample.value, now, sample.labels)
+
+    def scrape_every(self, url: str, interval: float):
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.scrape(url)
+                except Exception as e:
+                    print(f"Scrape of {url} failed: {e}")
+                self._stop.wait(interval)
+
+        thread = threading.Thread(target=run, name=f"scrape {url}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def evaluate(self, query: str, t: float) -> Dict:
+        """The ``data`` part of an instant query response"""
+        match = QUERY.match(query)
+        if not match or bool(match["aggregation"]) != bool(match["close"]):
+            raise BadQuery(f"unsupported query: {query}")
+        if match["aggregation"] and match["range"]:
+            raise BadQuery(f"range vectors cannot be aggregated directly: {query}")
+
+        matchers = {}
+        for label, value in MATCHER.findall(match["matchers"] or ""):
+            matchers[label] = value
+        if match["matchers"] and not matchers:
+            raise BadQuery(f"unsupported label matchers: {match['matchers']}")
+
+        with self._lock:
+            selected = [
+                (dict(labels), series) for (name, labels), series in self.series.items()
+                if name == match["name"]
+                and all(dict(labels).get(k) == v for k, v in matchers.items())
+            ]
+            if match["range"]:
+                window = parse_duration(match["range"])
+                result = [
+                    {"metric": {"__name__": match["name"], **labels},
+                     "values": [[ts, str(v)] for ts, v in series.between(t - window, t)]}
+                    for labels, series in selected
+                ]
+                return {"resultType": "matrix", "result": [r for r in result if r["values"]]}
+
+            samples = [(labels, series.at(t)) for labels, series in selected]
+        samples = [(labels, value) for labels, value in samples if value is not None]
+
+        if match["aggregation"]:
+            if not samples:
+                return {"resultType": "vector", "result": []}
+            value = AGGREGATIONS[match["aggregation"]]([value for _, value in samples])
+            return {"resultType": "vector", "result": [{"metric": {}, "value": [t, str(value)]}]}
+        return {
+            "resultType": "vector",
+            "result": [
+                {"metric": {"__name__": match["name"], **labels}, "value": [t, str(value)]}
+                for labels, value in samples
+            ],
+        }
+
+    def evaluate_range(self, query: str, start: float, end: float, step: float) -> Dict:
+        if step <= 0:
+            raise BadQuery("zero or negative query resolution step widths are not accepted")
+        series: Dict[str, Dict] = {}
+        t = start
+        while t <= end:
+            for sample in self.evaluate(query, t)["result"]:
+                key = json.dumps(sample["metric"], sort_keys=True)
+                series.setdefault(key, {"metric": sample["metric"], "values": []})
+                series[key]["values"].append(sample["value"])
+            t += step
+        return {"resultType": "matrix", "result": list(series.values())}
+
+    def start(self, port: int = 9090, host: str = "127.0.0.1") -> int:
+        """Serve the HTTP API in a background thread; returns the bound port"""
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name="fake-prometheus",
+                                  daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self._server.server_address[1]
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def _handler(prometheus: FakePrometheus):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._handle(urllib.parse.urlparse(self.path).query)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self._handle(self.rfile.read(length).decode())
+
+        def _handle(self, body: str):
+            path = urllib.parse.urlparse(self.path).path
+            params = {k: v[-1] for k, v in urllib.parse.parse_qs(body).items()}
+            prometheus.queries += 1
+            try:
+                if path == "/api/v1/query":
+                    data = prometheus.evaluate(
+                        params["query"], float(params.get("time", time.time()))
+                    )
+                elif path == "/api/v1/query_range":
+                    step = params["step"]
+                    data = prometheus.evaluate_range(
+                        params["query"], float(params["start"]), float(params["end"]),
+                        parse_duration(step) if step[-1] in "smhd" else float(step),
+                    )
+                elif path in ("/-/ready", "/-/healthy"):
+                    self._reply(200, b"Prometheus is Ready.\n", "text/plain")
+                    return
+                else:
+                    self._reply(404, b"404 page not found\n", "text/plain")
+                    return
+            except (BadQuery, KeyError, ValueError) as e:
+                body = {"status": "error", "errorType": "bad_data", "error": str(e)}
+                self._reply(400, json.dumps(body).encode())
+                return
+            self._reply(200, json.dumps({"status": "success", "data": data}).encode())
+
+        def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Prometheus query API")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--trace", help="Serve a trace CSV from load-test/load_trace.py")
+    parser.add_argument("--compression", type=float, default=1.0,
+                        help="Trace seconds replayed per real second")
+    parser.add_argument("--position", type=float, default=0.0,
+                        help="Trace seconds already in the past at startup, served as history")
+    parser.add_argument("--scrape", action="append", default=[], metavar="URL",
+                        help="Scrape this /metrics URL (repeatable)")
+    parser.add_argument("--scrape-interval", type=float, default=15.0)
+
+    args = parser.parse_args()
+
+    prometheus = FakePrometheus()
+    if args.trace:
+        prometheus.load_trace(args.trace, args.compression, args.position)
+    for url in args.scrape:
+        prometheus.scrape_every(url, args.scrape_interval)
+    port = prometheus.start(args.port)
+    print(f"Fake Prometheus listening on http://127.0.0.1:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        prometheus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in stack: the chat backend, forecaster and external scaler in
+one process, against a fake Prometheus and in-memory Redis.
+
+The services are the real FastAPI apps and gRPC servicer, served on
+loopback ports as in a deployment; only Prometheus and Redis are replaced.
+A poller stands in for KEDA and calls GetMetrics every pollingInterval of
+keda-scaledobject.yaml. It measures:
+
+- GetMetrics latency: scaler -> forecaster /current -> Prometheus query
+- reaction time: from a change in offered load to the first GetMetrics
+  response asking for the replicas that load needs
+- /forecast latency (training and prediction), with --forecast
+
+Load follows a trace (--trace, or a --pattern as in simulate.py), replayed
+--compression times faster than real time:
+
+- ``--source trace``: the fake Prometheus serves the trace directly
+- ``--source backend``: messages are posted to the backend at the trace's
+  rate and the fake Prometheus scrapes its /metrics, so the backend's
+  60s rate window is part of the measured pipeline
+
+    python offline-stack/harness.py --trace traces/day.csv --compression 60 --duration 120
+    python offline-stack/harness.py --source backend --pattern spike --peak-load 200 --compression 10
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List, Optional
+
+import aiohttp
+import grpc
+import requests
+import uvicorn
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("simulator", "backend", os.path.join("backend", "benchmarks"), "load-test"):
+    sys.path.insert(0, os.path.join(REPO_ROOT, directory))
+
+import simulate  # noqa: E402  (also puts forecaster and keda-scaler on sys.path)
+from simulate import forecaster_module, scaler_module  # noqa: E402
+import externalscaler_pb2  # noqa: E402
+import externalscaler_pb2_grpc  # noqa: E402
+import app as backend_module  # noqa: E402
+from fakes import FakeRedis  # noqa: E402
+from open_loop import arrival_times  # noqa: E402
+
+from fake_prometheus import FakePrometheus  # noqa: E402
+
+logger = logging.getLogger("harness")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def polling_interval(scaledobject_path: str) -> float:
+    with open(scaledobject_path) as f:
+        return float(yaml.safe_load(f)["spec"].get("pollingInterval", 30))
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": at(50),
+        "p95": at(95),
+        "p99": at(99),
+        "max": ordered[-1],
+    }
+
+
+class ServerThread:
+    """A uvicorn server on its own thread and event loop"""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class Stack:
+    """Fake Prometheus, backend, forecaster and scaler, wired together on loopback"""
+
+    def __init__(self, trace: simulate.LoadTrace, source: str, compression: float,
+                 position: float, scrape_interval: float, rate_scale: float, senders: int):
+        self.trace = trace
+        self.source = source
+        self.compression = compression
+        self.position = position
+        self.scrape_interval = scrape_interval
+        self.rate_scale = rate_scale
+        self.senders = senders
+        self.prometheus = FakePrometheus()
+        self.servers: List[ServerThread] = []
+        self.grpc_server: Optional[grpc.Server] = None
+        self.started = 0.0
+        self._stop = threading.Event()
+        self._load_thread: Optional[threading.Thread] = None
+        self.load_outcomes: Dict[str, int] = {}
+
+    def trace_time(self, wall: Optional[float] = None) -> float:
+        wall = time.time() if wall is None else wall
+        return self.position + (wall - self.started) * self.compression
+
+    def offered_load(self) -> float:
+        """Messages per second the trace calls for right now"""
+        value = self.trace.value_at(self.trace_time())
+        return value * self.rate_scale if self.source == "backend" else value
+
+    def start(self):
+        self.started = time.time()
+        prometheus_url = f"http://127.0.0.1:{self.prometheus.start(0)}"
+
+        fake_redis = FakeRedis()
+        backend_module.redis_client = fake_redis
+        backend_module.fanout.redis = fake_redis
+        backend_module.history.redis = fake_redis
+        backend = ServerThread(backend_module.app, free_port())
+        backend.start()
+        self.backend_url = f"http://127.0.0.1:{backend.port}"
+
+        forecaster_module.PROMETHEUS_URL = prometheus_url
+        forecaster_module.redis_client = simulate.MemoryRedis()
+        forecaster = ServerThread(forecaster_module.app, free_port())
+        forecaster.start()
+        self.forecaster_url = f"http://127.0.0.1:{forecaster.port}"
+        self.servers = [backend, forecaster]
+
+        scaler_module.PROMETHEUS_URL = prometheus_url
+        scaler_module.FORECASTER_URL = self.forecaster_url
+        self.scaler = scaler_module.ExternalScaler()
+        self.scaler.forecaster_client.start_prober()
+        self.grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        externalscaler_pb2_grpc.add_ExternalScalerServicer_to_server(self.scaler, self.grpc_server)
+        scaler_port = self.grpc_server.add_insecure_port("127.0.0.1:0")
+        self.grpc_server.start()
+        self.scaler_address = f"127.0.0.1:{scaler_port}"
+
+        if self.source == "trace":
+            self.prometheus.replay(
+                scaler_module.METRIC_NAME, self.trace.times, self.trace.values,
+                self.compression, self.position, self.started,
+            )
+        else:
+            self.prometheus.scrape_every(f"{self.backend_url}/metrics", self.scrape_interval)
+            self._load_thread = threading.Thread(
+                target=lambda: asyncio.run(self._post_messages()), daemon=True
+            )
+            self._load_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._load_thread:
+            self._load_thread.join(timeout=30)
+        if self.grpc_server:
+            self.grpc_server.stop(grace=1)
+        for server in reversed(self.servers):
+            server.stop()
+        self.prometheus.stop()
+
+    async def _post_messages(self):
+        """Post messages to the backend at the trace's rate, open loop"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = set()
+
+        async def post(session: aiohttp.ClientSession, seq: int):
+            try:
+                async with session.post(
+                    f"{self.backend_url}/api/message",
+                    json={"sender": f"stack-{seq % self.senders}", "message": f"message {seq}"},
+                ) as response:
+                    await response.read()
+                    outcome = str(response.status)
+            except Exception as e:
+                outcome = type(e).__name__
+            self.load_outcomes[outcome] = self.load_outcomes.get(outcome, 0) + 1
+
+        rate = lambda elapsed: self.trace.value_at(  # noqa: E731
+            self.position + elapsed * self.compression
+        ) * self.rate_scale
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            for seq, intended in enumerate(arrival_times(start, rate, float("inf"), "uniform")):
+                if self._stop.is_set():
+                    break
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(post(session, seq))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks, timeout=10)
+
+
+class KedaPoller:
+    """Calls GetMetrics like KEDA does and times the scaler's answers"""
+
+    def __init__(self, stack: Stack, interval: float):
+        self.stack = stack
+        self.interval = interval
+        self.rpc_latencies: List[float] = []
+        self.reactions: List[float] = []
+        self.superseded = 0
+        self.timeline: List[Dict] = []
+        self._expected = None
+        self._changed_at = 0.0
+        self._pending = False
+
+    def watch(self, stop: threading.Event):
+        """Note when the replicas the offered load needs change, every 100ms"""
+        while not stop.is_set():
+            expected = scaler_module.desired_replicas_for(self.stack.offered_load())
+            if expected != self._expected:
+                if self._pending:
+                    self.superseded += 1
+                self._pending = True  # Including startup: the pipeline starts empty
+                self._expected = expected
+                self._changed_at = time.time()
+            stop.wait(0.1)
+
+    def poll(self, stop: threading.Event):
+        with grpc.insecure_channel(self.stack.scaler_address) as channel:
+            stub = externalscaler_pb2_grpc.ExternalScalerStub(channel)
+            request = externalscaler_pb2.GetMetricsRequest(
+                scaled_object_ref=externalscaler_pb2.ScaledObjectRef(name="chat-backend-scaler"),
+                metric_name="predicted_load",
+            )
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = stub.GetMetrics(request)
+                latency = time.perf_counter() - started
+                self.rpc_latencies.append(latency)
+
+                reported = int(response.metrics[0].metric_value / scaler_module.TARGET_VALUE)
+                expected = self._expected
+                now = time.time()
+                if self._pending and reported == expected:
+                    self.reactions.append(now - self._changed_at)
+                    self._pending = False
+                self.timeline.append({
+                    "t": round(now - self.stack.started, 3),
+                    "trace_t": round(self.stack.trace_time(now), 1),
+                    "offered": round(self.stack.offered_load(), 2),
+                    "expected_replicas": expected,
+                    "reported_replicas": reported,
+                    "rpc_ms": round(latency * 1000, 2),
+                })
+                stop.wait(self.interval)
+
+
+def time_forecast(forecaster_url: str) -> float:
+    started = time.perf_counter()
+    response = requests.post(
+        f"{forecaster_url}/forecast",
+        json={"metric_name": scaler_module.METRIC_NAME,
+              "horizon_minutes": scaler_module.FORECAST_MINUTES},
+        timeout=300,
+    )
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline backend/forecaster/scaler pipeline test")
+    parser.add_argument("--trace", help="Trace CSV (time,messages_per_second[,connections])")
+    parser.add_argument("--pattern", choices=["daily", "spike", "random"], default="spike",
+                        help="Synthetic trace when --trace is not given")
+    parser.add_argument("--hours", type=float, default=2, help="Synthetic trace length")
+    parser.add_argument("--base-load", type=float, default=10, help="Synthetic base msg/s")
+    parser.add_argument("--peak-load", type=float, default=80, help="Synthetic peak msg/s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", choices=["trace", "backend"], default="trace",
+                        help="Serve the trace from Prometheus, or drive the backend with it")
+    parser.add_argument("--compression", type=float, default=60.0,
+                        help="Trace seconds replayed per real second")
+    parser.add_argument("--position", type=float, default=0.0,
+                        help="Trace seconds already in the past at startup, served as history")
+    parser.add_argument("--duration", type=float, default=120.0, help="Real seconds to run")
+    parser.add_argument("--rate-scale", type=float, default=1.0,
+                        help="Multiplier on the trace's rate when posting to the backend")
+    parser.add_argument("--senders", type=int, default=1000, help="Distinct HTTP sender ids")
+    parser.add_argument("--scrape-interval", type=float, default=15.0,
+                        help="Seconds between scrapes of the backend")
+    parser.add_argument("--poll-interval", type=float,
+                        help="Seconds between GetMetrics calls (default: pollingInterval)")
+    parser.add_argument("--scaledobject", default=simulate.SCALEDOBJECT_PATH)
+    parser.add_argument("--scaler-manifest", default=simulate.SCALER_DEPLOYMENT_PATH)
+    parser.add_argument("--forecast", action="store_true",
+                        help="Also time /forecast (model training) at the start and end")
+    parser.add_argument("--timeline", help="Write every GetMetrics answer to this CSV file")
+    parser.add_argument("--output", help="Write the summary to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show service logs")
+
+    args = parser.parse_args()
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    for name in ("forecaster", "scaler", "cmdstanpy", "prophet"):
+        logging.getLogger(name).setLevel(log_level)
+
+    simulate.apply_scaler_env(simulate.load_scaler_env(args.scaler_manifest))
+    if args.trace:
+        trace = simulate.LoadTrace.from_csv(args.trace)
+    else:
+        trace = simulate.LoadTrace.synthetic(
+            args.pattern, args.hours, args.base_load, args.peak_load, args.seed
+        )
+    poll_interval = args.poll_interval or polling_interval(args.scaledobject)
+
+    stack = Stack(trace, args.source, args.compression, args.position,
+                  args.scrape_interval, args.rate_scale, args.senders)
+    stack.start()
+    print(f"Stack up: backend {stack.backend_url}, forecaster {stack.forecaster_url}, "
+          f"scaler {stack.scaler_address}; polling every {poll_interval:g}s for {args.duration:g}s")
+
+    forecast_seconds = []
+    poller = KedaPoller(stack, poll_interval)
+    stop = threading.Event()
+    threads = [threading.Thread(target=poller.watch, args=(stop,), daemon=True),
+               threading.Thread(target=poller.poll, args=(stop,), daemon=True)]
+    try:
+        if args.forecast:
+            forecast_seconds.append(time_forecast(stack.forecaster_url))
+        for thread in threads:
+            thread.start()
+        stop.wait(args.duration)
+        if args.forecast:
+            forecast_seconds.append(time_forecast(stack.forecaster_url))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=30)
+        stack.stop()
+
+    summary = {
+        "source": args.source,
+        "compression": args.compression,
+        "duration_seconds": args.duration,
+        "poll_interval_seconds": poll_interval,
+        "get_metrics_ms": {
+            k: v * 1000 if k != "count" else v
+            for k, v in percentiles(poller.rpc_latencies).items()
+        },
+        "reaction_seconds": percentiles(poller.reactions),
+        "reactions_superseded": poller.superseded,
+        "forecast_seconds": forecast_seconds,
+        "prometheus_queries": stack.prometheus.queries,
+        "backend_posts": stack.load_outcomes,
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.timeline and poller.timeline:
+        with open(args.timeline, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(poller.timeline[0].keys()))
+            writer.writeheader()
+            writer.writerows(poller.timeline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
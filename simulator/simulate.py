@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+"""
+Offline closed-loop autoscaling simulator - replays a load trace through the
+real LoadForecaster and ExternalScaler decision logic against a model of the
+HPA behavior configured in keda-scaledobject.yaml
+"""
+
+import argparse
+import asyncio
+import bisect
+import csv
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+import pandas as pd
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "forecaster"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "keda-scaler"))
+
+import forecaster as forecaster_module  # noqa: E402
+import scaler as scaler_module  # noqa: E402
+import externalscaler_pb2  # noqa: E402
+
+SCALEDOBJECT_PATH = os.path.join(REPO_ROOT, "k8s", "ml-autoscaler", "keda-scaledobject.yaml")
+SCALER_DEPLOYMENT_PATH = os.path.join(REPO_ROOT, "k8s", "ml-autoscaler", "keda-scaler.yaml")
+
+
+# ---------------------------------------------------------------------------
+# Load traces
+# ---------------------------------------------------------------------------
+
+class LoadTrace:
+    """Piecewise-constant offered load (messages/second) over simulated seconds"""
+
+    def __init__(self, times: List[float], values: List[float]):
+        if not times:
+            raise ValueError("Load trace is empty")
+        self.times = times
+        self.values = values
+        self.duration = times[-1]
+
+    def value_at(self, t: float) -> float:
+        index = bisect.bisect_right(self.times, t) - 1
+        return self.values[max(0, index)]
+
+    @classmethod
+    def from_csv(cls, path: str) -> "LoadTrace":
+        """Read ``time,value`` rows; time is seconds or an ISO-8601 timestamp"""
+        times: List[float] = []
+        values: List[float] = []
+        origin = None
+
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                try:
+                    value = float(row[1])
+                except (IndexError, ValueError):
+                    continue  # header or malformed row
+                try:
+                    t = float(row[0])
+                except ValueError:
+                    t = datetime.fromisoformat(row[0]).timestamp()
+                if origin is None:
+                    origin = t
+                times.append(t - origin)
+                values.append(max(0.0, value))
+
+        return cls(times, values)
+
+    @classmethod
+    def synthetic(cls, pattern: str, hours: float, base: float, peak: float,
+                  seed: int = 0) -> "LoadTrace":
+        """Generate the spike/daily/random shapes used by the load tests"""
+        rng = random.Random(seed)
+        duration = int(hours * 3600)
+        times: List[float] = []
+        values: List[float] = []
+
+        if pattern == "daily":
+            # Same shape as LoadForecaster._generate_synthetic_data, one point per minute
+            amplitude = (peak - base) / 2
+            midpoint = base + amplitude
+            for t in range(0, duration, 60):
+                hour = (t / 3600) % 24
+                value = midpoint + amplitude * math.sin(2 * math.pi * hour / 24 - math.pi / 2)
+                if rng.random() < 0.05:
+                    value += rng.uniform(0.2, 0.5) * (peak - base)
+                else:
+                    value += rng.gauss(0, 0.05 * midpoint)
+                times.append(t)
+                values.append(max(0.0, value))
+
+        elif pattern == "spike":
+            # Baseline with a 10 minute spike to peak once per hour
+            for t in range(0, duration, 30):
+                minute = (t // 60) % 60
+                value = peak if 30 <= minute < 40 else base
+                times.append(t)
+                values.append(value * rng.uniform(0.95, 1.05))
+
+        elif pattern == "random":
+            # 10% chance of a 30-60s spike at every 10s check, as in simulate_random_spikes
+            spike_until = -1
+            spike_value = base
+            for t in range(0, duration, 10):
+                if t >= spike_until and rng.random() < 0.1:
+                    spike_until = t + rng.randint(30, 60)
+                    spike_value = base + rng.uniform(0.3, 1.0) * (peak - base)
+                times.append(t)
+                values.append(spike_value if t < spike_until else base)
+
+        else:
+            raise ValueError(f"Unknown pattern: {pattern}")
+
+        return cls(times, values)
+
+
+# ---------------------------------------------------------------------------
+# HPA model
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ScalingPolicy:
+    type: str
+    value: int
+    period_seconds: int
+
+
+@dataclass
+class ScalingRules:
+    stabilization_window_seconds: int
+    select_policy: str
+    policies: List[ScalingPolicy]
+
+    @classmethod
+    def from_dict(cls, data: dict, default_window: int) -> "ScalingRules":
+        return cls(
+            stabilization_window_seconds=int(data.get("stabilizationWindowSeconds", default_window)),
+            select_policy=data.get("selectPolicy", "Max"),
+            policies=[
+                ScalingPolicy(p["type"], int(p["value"]), int(p["periodSeconds"]))
+                for p in data.get("policies", [])
+            ],
+        )
+
+
+@dataclass
+class HPAConfig:
+    min_replicas: int
+    max_replicas: int
+    scale_up: ScalingRules
+    scale_down: ScalingRules
+    sync_period_seconds: int = 15
+    tolerance: float = 0.1
+
+    @classmethod
+    def from_scaledobject(cls, path: str) -> "HPAConfig":
+        with open(path) as f:
+            spec = yaml.safe_load(f)["spec"]
+
+        behavior = (
+            spec.get("advanced", {})
+            .get("horizontalPodAutoscalerConfig", {})
+            .get("behavior", {})
+        )
+        return cls(
+            min_replicas=int(spec.get("minReplicaCount", 0)),
+            max_replicas=int(spec.get("maxReplicaCount", 100)),
+            scale_up=ScalingRules.from_dict(behavior.get("scaleUp", {}), 0),
+            scale_down=ScalingRules.from_dict(behavior.get("scaleDown", {}), 300),
+        )
+
+
+class HPAModel:
+    """Replica computation of the Kubernetes HPA controller for an AverageValue external metric"""
+
+    def __init__(self, config: HPAConfig):
+        self.config = config
+        self.recommendations: Deque[Tuple[float, int]] = deque()
+        self.scale_up_events: Deque[Tuple[float, int]] = deque()
+        self.scale_down_events: Deque[Tuple[float, int]] = deque()
+
+    def reconcile(self, t: float, current: int, metric_value: float, target: float) -> int:
+        usage_ratio = metric_value / (target * current) if current else float("inf")
+        if abs(usage_ratio - 1.0) <= self.config.tolerance:
+            desired = current
+        else:
+            desired = math.ceil(metric_value / target)
+        desired = max(self.config.min_replicas, min(self.config.max_replicas, desired))
+
+        desired = self._stabilize(t, current, desired)
+        desired = self._apply_rate_limits(t, current, desired)
+
+        if desired > current:
+            self.scale_up_events.append((t, desired - current))
+        elif desired < current:
+            self.scale_down_events.append((t, current - desired))
+        return desired
+
+    def _stabilize(self, t: float, current: int, desired: int) -> int:
+        up_window = self.config.scale_up.stabilization_window_seconds
+        down_window = self.config.scale_down.stabilization_window_seconds
+        horizon = max(up_window, down_window)
+        while self.recommendations and self.recommendations[0][0] <= t - horizon:
+            self.recommendations.popleft()
+
+        up_recommendation = desired
+        down_recommendation = desired
+        for ts, replicas in self.recommendations:
+            if ts > t - up_window:
+                up_recommendation = min(up_recommendation, replicas)
+            if ts > t - down_window:
+                down_recommendation = max(down_recommendation, replicas)
+        self.recommendations.append((t, desired))
+
+        recommendation = current
+        if recommendation < up_recommendation:
+            recommendation = up_recommendation
+        if recommendation > down_recommendation:
+            recommendation = down_recommendation
+        return recommendation
+
+    @staticmethod
+    def _change_in_period(events: Deque[Tuple[float, int]], t: float, period: int) -> int:
+        return sum(delta for ts, delta in events if ts > t - period)
+
+    def _apply_rate_limits(self, t: float, current: int, desired: int) -> int:
+        if desired > current:
+            rules = self.config.scale_up
+            select_max = rules.select_policy != "Min"
+            limit = -sys.maxsize if select_max else sys.maxsize
+            for policy in rules.policies:
+                added = self._change_in_period(self.scale_up_events, t, policy.period_seconds)
+                deleted = self._change_in_period(self.scale_down_events, t, policy.period_seconds)
+                period_start = current - added + deleted
+                if policy.type == "Pods":
+                    proposed = period_start + policy.value
+                else:
+                    proposed = math.ceil(period_start * (1 + policy.value / 100))
+                limit = max(limit, proposed) if select_max else min(limit, proposed)
+            if rules.policies:
+                limit = max(limit, current)
+                desired = min(desired, limit)
+            return min(desired, self.config.max_replicas)
+
+        if desired < current:
+            rules = self.config.scale_down
+            select_min = rules.select_policy == "Min"
+            limit = -sys.maxsize if select_min else sys.maxsize
+            for policy in rules.policies:
+                added = self._change_in_period(self.scale_up_events, t, policy.period_seconds)
+                deleted = self._change_in_period(self.scale_down_events, t, policy.period_seconds)
+                period_start = current + deleted - added
+                if policy.type == "Pods":
+                    proposed = period_start - policy.value
+                else:
+                    proposed = int(period_start * (1 - policy.value / 100))
+                limit = max(limit, proposed) if select_min else min(limit, proposed)
+            if rules.policies:
+                limit = min(limit, current)
+                desired = max(desired, limit)
+            return max(desired, self.config.min_replicas)
+
+        return desired
+
+
+# ---------------------------------------------------------------------------
+# Metrics pipeline and in-process forecaster/scaler
+# ---------------------------------------------------------------------------
+
+class SimClock:
+    def __init__(self, start: datetime):
+        self.start = start
+        self.t = 0.0
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.t)
+
+
+class MetricsPipeline:
+    """Models the backend's 60s rate window and the Prometheus scrape interval"""
+
+    def __init__(self, clock: SimClock, rate_window: int = 60, scrape_interval: int = 15):
+        self.clock = clock
+        self.scrape_interval = scrape_interval
+        self.window: Deque[float] = deque(maxlen=rate_window)
+        self.history: Deque[Tuple[datetime, float]] = deque(
+            maxlen=forecaster_module.HISTORY_HOURS * 3600 // scrape_interval
+        )
+        self.current = 0.0
+
+    def observe(self, load: float):
+        """Record one second of offered load; scrape on interval boundaries"""
+        self.window.append(load)
+        if int(self.clock.t) % self.scrape_interval == 0:
+            self.current = sum(self.window) / self.window.maxlen
+            self.history.append((self.clock.now(), self.current))
+
+
+class MemoryRedis:
+    """Minimal in-memory substitute for the forecaster's metadata writes"""
+
+    def __init__(self):
+        self.data: Dict[str, str] = {}
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def ping(self):
+        return True
+
+
+class SimForecaster(forecaster_module.LoadForecaster):
+    """LoadForecaster reading Prometheus data from the simulated pipeline"""
+
+    def __init__(self, clock: SimClock, pipeline: MetricsPipeline, model_kind: str):
+        super().__init__()
+        self.clock = clock
+        self.pipeline = pipeline
+        self.model_kind = model_kind
+        self._prediction_key = None
+        self._prediction = None
+
+    def now(self) -> datetime:
+        return self.clock.now()
+
+    async def get_current_value(self, metric_name: str) -> float:
+        return self.pipeline.current
+
+    async def fetch_prometheus_metrics(self, metric_name: str) -> pd.DataFrame:
+        if len(self.pipeline.history) < forecaster_module.MIN_TRAINING_POINTS:
+            return self._generate_synthetic_data()
+        timestamps, values = zip(*self.pipeline.history)
+        return pd.DataFrame({'ds': list(timestamps), 'y': list(values)})
+
+    def train_model(self, data: pd.DataFrame):
+        if self.model_kind == "prophet":
+            return super().train_model(data)
+        # Persistence model: skips Prophet so days of simulated time run in seconds
+        self.model = self.model_kind
+        self.last_training_time = self.now()
+
+    def predict(self, horizon_minutes: int) -> Dict:
+        if self.model_kind != "prophet":
+            now = self.now()
+            value = self.pipeline.current
+            return {
+                'timestamps': [
+                    (now + timedelta(minutes=i + 1)).strftime('%Y-%m-%d %H:%M:%S')
+                    for i in range(horizon_minutes)
+                ],
+                'predicted_values': [value] * horizon_minutes,
+                'confidence_lower': [value] * horizon_minutes,
+                'confidence_upper': [value] * horizon_minutes,
+            }
+
+        # Prophet forecasts from the end of its training data, so the result
+        # only changes when the model is retrained
+        key = (id(self.model), horizon_minutes)
+        if key != self._prediction_key:
+            self._prediction = super().predict(horizon_minutes)
+            self._prediction_key = key
+        return self._prediction
+
+
+class SimForecasterClient(scaler_module.ForecasterClient):
+    """ForecasterClient calling the forecaster in-process instead of over HTTP"""
+
+    def __init__(self, forecaster: SimForecaster, clock: SimClock, pipeline: MetricsPipeline,
+                 outages: List[Tuple[float, float]]):
+        super().__init__(clock=lambda: clock.t)
+        self.forecaster = forecaster
+        self.pipeline = pipeline
+        self.outages = outages
+        self.loop = asyncio.new_event_loop()
+
+    def request_forecast(self) -> dict:
+        if any(start <= self.clock() < end for start, end in self.outages):
+            raise ConnectionError("simulated forecaster outage")
+        response = self.loop.run_until_complete(
+            self.forecaster.get_forecast(
+                scaler_module.METRIC_NAME, scaler_module.FORECAST_MINUTES
+            )
+        )
+        return response.dict()
+
+    def request_current(self) -> dict:
+        if any(start <= self.clock() < end for start, end in self.outages):
+            raise ConnectionError("simulated forecaster outage")
+        value, _ = self.loop.run_until_complete(
+            self.forecaster.get_cached_current_value(scaler_module.METRIC_NAME)
+        )
+        return {'current_value': value}
+
+    def query_prometheus(self) -> float:
+        return self.pipeline.current
+
+
+# ---------------------------------------------------------------------------
+# Closed-loop simulation
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SimulationResult:
+    simulated_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    slo_violation_seconds: float = 0.0
+    slo_violation_episodes: int = 0
+    pod_seconds: float = 0.0
+    over_provisioned_pod_seconds: float = 0.0
+    scale_up_events: int = 0
+    scale_down_events: int = 0
+    min_replicas_seen: int = 0
+    max_replicas_seen: int = 0
+    reaction_times: List[float] = field(default_factory=list)
+    timeline: List[dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        reactions = sorted(self.reaction_times)
+        summary = {k: v for k, v in asdict(self).items() if k not in ("reaction_times", "timeline")}
+        summary.update({
+            "slo_violation_pct": 100 * self.slo_violation_seconds / max(1.0, self.simulated_seconds),
+            "pod_minutes": self.pod_seconds / 60,
+            "over_provisioned_pod_minutes": self.over_provisioned_pod_seconds / 60,
+            "over_provisioned_pct": 100 * self.over_provisioned_pod_seconds / max(1.0, self.pod_seconds),
+            "reaction_time_mean": sum(reactions) / len(reactions) if reactions else 0.0,
+            "reaction_time_p95": reactions[int(0.95 * (len(reactions) - 1))] if reactions else 0.0,
+            "reaction_time_max": reactions[-1] if reactions else 0.0,
+        })
+        return summary
+
+
+class ClusterSimulator:
+    """Steps pods, metrics, scaler and HPA together at one-second resolution"""
+
+    def __init__(self, trace: LoadTrace, hpa_config: HPAConfig, scaler: scaler_module.ExternalScaler,
+                 clock: SimClock, pipeline: MetricsPipeline, pod_capacity: float,
+                 startup_delay: float, slo_utilization: float = 1.0):
+        self.trace = trace
+        self.hpa_config = hpa_config
+        self.hpa = HPAModel(hpa_config)
+        self.scaler = scaler
+        self.clock = clock
+        self.pipeline = pipeline
+        self.pod_capacity = pod_capacity
+        self.startup_delay = startup_delay
+        self.slo_utilization = slo_utilization
+
+        # Ready-at times of every provisioned pod; the initial replicas are already up
+        self.pods: List[float] = [0.0] * hpa_config.min_replicas
+        self.target_size = scaler.GetMetricSpec(None, None).metric_specs[0].target_size
+
+    def _scale_to(self, replicas: int):
+        t = self.clock.t
+        if replicas > len(self.pods):
+            self.pods.extend([t + self.startup_delay] * (replicas - len(self.pods)))
+        elif replicas < len(self.pods):
+            # Kubernetes removes not-yet-ready pods first
+            self.pods.sort()
+            del self.pods[replicas:]
+
+    def run(self) -> SimulationResult:
+        result = SimulationResult(
+            min_replicas_seen=len(self.pods), max_replicas_seen=len(self.pods)
+        )
+        request = externalscaler_pb2.GetMetricsRequest(metric_name="predicted_load")
+        violation_start: Optional[float] = None
+        wall_start = time.time()
+        duration = int(self.trace.duration)
+
+        for second in range(duration + 1):
+            self.clock.t = float(second)
+            load = self.trace.value_at(second)
+            self.pipeline.observe(load)
+            self.scaler.forecaster_client.probe_if_due()
+
+            if second % self.hpa_config.sync_period_seconds == 0:
+                response = self.scaler.GetMetrics(request, None)
+                metric_value = response.metrics[0].metric_value
+                current = len(self.pods)
+                desired = self.hpa.reconcile(second, current, metric_value, self.target_size)
+                if desired > current:
+                    result.scale_up_events += 1
+                elif desired < current:
+                    result.scale_down_events += 1
+                self._scale_to(desired)
+                result.timeline.append({
+                    "t": second,
+                    "offered_load": load,
+                    "observed_load": self.pipeline.current,
+                    "metric_value": metric_value,
+                    "replicas": desired,
+                    "ready": sum(1 for ready_at in self.pods if ready_at <= second),
+                })
+
+            total = len(self.pods)
+            ready = sum(1 for ready_at in self.pods if ready_at <= second)
+            needed = max(self.hpa_config.min_replicas, math.ceil(load / self.pod_capacity))
+
+            result.pod_seconds += total
+            result.over_provisioned_pod_seconds += max(0, total - needed)
+            result.min_replicas_seen = min(result.min_replicas_seen, total)
+            result.max_replicas_seen = max(result.max_replicas_seen, total)
+
+            if load > ready * self.pod_capacity * self.slo_utilization:
+                result.slo_violation_seconds += 1
+                if violation_start is None:
+                    violation_start = second
+                    result.slo_violation_episodes += 1
+            elif violation_start is not None:
+                result.reaction_times.append(second - violation_start)
+                violation_start = None
+
+        if violation_start is not None:
+            result.reaction_times.append(duration - violation_start)
+
+        result.simulated_seconds = duration
+        result.wall_seconds = time.time() - wall_start
+        return result
+
+
+def load_scaler_env(path: str) -> Dict[str, str]:
+    """Environment of the keda-external-scaler container in its Deployment manifest"""
+    with open(path) as f:
+        for doc in yaml.safe_load_all(f):
+            if doc and doc.get("kind") == "Deployment":
+                container = doc["spec"]["template"]["spec"]["containers"][0]
+                return {e["name"]: str(e["value"]) for e in container.get("env", [])}
+    return {}
+
+
+def apply_scaler_env(scaler_env: Dict[str, str]):
+    """Configure the imported scaler module as its container would be"""
+    scaler_module.METRIC_NAME = scaler_env.get("METRIC_NAME", scaler_module.METRIC_NAME)
+    scaler_module.FORECAST_MINUTES = int(scaler_env.get("FORECAST_MINUTES", scaler_module.FORECAST_MINUTES))
+    scaler_module.TARGET_VALUE = float(scaler_env.get("TARGET_VALUE", scaler_module.TARGET_VALUE))
+    scaler_module.MIN_REPLICAS = int(scaler_env.get("MIN_REPLICAS", scaler_module.MIN_REPLICAS))
+    scaler_module.MAX_REPLICAS = int(scaler_env.get("MAX_REPLICAS", scaler_module.MAX_REPLICAS))
+
+
+def parse_outage(value: str) -> Tuple[float, float]:
+    start, end = value.split(":")
+    return float(start) * 60, float(end) * 60
+
+
+def print_report(result: SimulationResult):
+    s = result.summary()
+    speedup = s["simulated_seconds"] / s["wall_seconds"] if s["wall_seconds"] > 0 else float("inf")
+    print("\n=== SIMULATION RESULTS ===")
+    print(f"Simulated {s['simulated_seconds'] / 3600:.1f}h in {s['wall_seconds']:.1f}s ({speedup:.0f}x real time)")
+    print(f"Replicas: min={s['min_replicas_seen']}, max={s['max_replicas_seen']}, "
+          f"scale-ups={s['scale_up_events']}, scale-downs={s['scale_down_events']}")
+    print(f"SLO violations: {s['slo_violation_seconds']:.0f}s ({s['slo_violation_pct']:.2f}%) "
+          f"in {s['slo_violation_episodes']} episodes")
+    print(f"Pod-minutes: {s['pod_minutes']:.0f}, over-provisioned: "
+          f"{s['over_provisioned_pod_minutes']:.0f} ({s['over_provisioned_pct']:.1f}%)")
+    print(f"Reaction time: mean={s['reaction_time_mean']:.1f}s, "
+          f"p95={s['reaction_time_p95']:.1f}s, max={s['reaction_time_max']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline closed-loop autoscaling simulator")
+    parser.add_argument("--trace", help="CSV load trace (time,value in msg/sec)")
+    parser.add_argument("--pattern", choices=["spike", "daily", "random"], default="daily",
+                        help="Synthetic load pattern when no trace is given")
+    parser.add_argument("--hours", type=float, default=24, help="Synthetic trace duration in hours")
+    parser.add_argument("--base-load", type=float, default=20, help="Synthetic baseline msg/sec")
+    parser.add_argument("--peak-load", type=float, default=80, help="Synthetic peak msg/sec")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--scaledobject", default=SCALEDOBJECT_PATH,
+                        help="ScaledObject manifest providing replica bounds and HPA behavior")
+    parser.add_argument("--scaler-manifest", default=SCALER_DEPLOYMENT_PATH,
+                        help="Scaler Deployment manifest providing TARGET_VALUE and friends")
+    parser.add_argument("--target-value", type=float, help="Override the scaler TARGET_VALUE")
+    parser.add_argument("--pod-capacity", type=float, default=10,
+                        help="Messages/sec one pod can serve")
+    parser.add_argument("--startup-delay", type=float, default=30,
+                        help="Seconds from scale-up until a pod is ready")
+    parser.add_argument("--slo-utilization", type=float, default=1.0,
+                        help="Fraction of ready capacity above which the SLO is violated")
+    parser.add_argument("--hpa-sync-period", type=int, default=15, help="HPA sync period in seconds")
+    parser.add_argument("--scrape-interval", type=int, default=15, help="Prometheus scrape interval")
+    parser.add_argument("--model", choices=["persistence", "prophet"], default="persistence",
+                        help="Model for forecast requests; prophet retrains every 10 simulated minutes")
+    parser.add_argument("--outage", action="append", type=parse_outage, default=[],
+                        metavar="START:END", help="Forecaster outage window in minutes (repeatable)")
+    parser.add_argument("--timeline", help="Write the per-decision timeline to this CSV file")
+    parser.add_argument("--output", help="Write the summary to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show forecaster and scaler logs")
+
+    args = parser.parse_args()
+
+    log_level = logging.INFO if args.verbose else logging.CRITICAL
+    for name in ("forecaster", "scaler", "cmdstanpy", "prophet"):
+        logging.getLogger(name).setLevel(log_level)
+
+    apply_scaler_env(load_scaler_env(args.scaler_manifest))
+    if args.target_value is not None:
+        scaler_module.TARGET_VALUE = args.target_value
+    forecaster_module.redis_client = MemoryRedis()
+
+    if args.trace:
+        trace = LoadTrace.from_csv(args.trace)
+    else:
+        trace = LoadTrace.synthetic(args.pattern, args.hours, args.base_load, args.peak_load, args.seed)
+
+    hpa_config = HPAConfig.from_scaledobject(args.scaledobject)
+    hpa_config.sync_period_seconds = args.hpa_sync_period
+
+    random.seed(args.seed)
+    forecaster_module.np.random.seed(args.seed)
+    clock = SimClock(datetime.utcnow().replace(microsecond=0))
+    pipeline = MetricsPipeline(clock, scrape_interval=args.scrape_interval)
+    forecaster = SimForecaster(clock, pipeline, args.model)
+    scaler = scaler_module.ExternalScaler(
+        SimForecasterClient(forecaster, clock, pipeline, args.outage)
+    )
+
+    print(f"Simulating {trace.duration / 3600:.1f}h of load "
+          f"(TARGET_VALUE={scaler_module.TARGET_VALUE}, replicas "
+          f"{hpa_config.min_replicas}-{hpa_config.max_replicas}, model={args.model})")
+
+    simulator = ClusterSimulator(
+        trace, hpa_config, scaler, clock, pipeline,
+        pod_capacity=args.pod_capacity,
+        startup_delay=args.startup_delay,
+        slo_utilization=args.slo_utilization,
+    )
+    result = simulator.run()
+    print_report(result)
+
+    if args.timeline:
+        with open(args.timeline, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(result.timeline[0].keys()))
+            writer.writeheader()
+            writer.writerows(result.timeline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result.summary(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()